@@ -6,6 +6,7 @@ from sqlalchemy import and_
 
 from ...core.database import get_db
 from ...core.dependencies import get_current_user
+from ...core.shared_cache import shared_cache
 from ...models.user import User, UserRole
 from ...models.account import AccountConfig
 from ...models.permission import AccountPermission
@@ -66,6 +67,7 @@ async def create_account(
     )
     db.add(account)
     db.commit()
+    await shared_cache.invalidate("account_config")
     db.refresh(account)
 
     return account
@@ -99,6 +101,7 @@ async def update_account(
         setattr(account, field, value)
 
     db.commit()
+    await shared_cache.invalidate("account_config")
     db.refresh(account)
 
     return account
@@ -133,6 +136,7 @@ async def delete_account(
 
     db.delete(account)
     db.commit()
+    await shared_cache.invalidate("account_config")
 
     return {"message": "交易账户删除成功"}
 
@@ -212,6 +216,7 @@ async def update_permissions(
             db.add(permission)
 
     db.commit()
+    await shared_cache.invalidate("account_config")
 
     return {"message": "权限分配更新成功"}
 
@@ -280,6 +285,7 @@ async def set_user_permissions(
             db.add(permission)
 
     db.commit()
+    await shared_cache.invalidate("account_config")
 
     return {"message": "用户权限设置成功"}
 
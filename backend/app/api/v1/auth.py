@@ -8,6 +8,7 @@ from typing import List, Optional
 from ...core.database import get_db
 from ...core.security import verify_password, create_access_token, get_password_hash, verify_token
 from ...core.dependencies import get_current_user, get_user_permissions
+from ...core.executors import auth_executor
 from ...models.user import User, UserRole
 from ...services.security_service import SecurityService
 
@@ -68,7 +69,8 @@ async def login(
     # Find user by username
     user = db.query(User).filter(User.username == login_request.username).first()
 
-    if not user or not verify_password(login_request.password, user.password_hash):
+    # bcrypt is slow on purpose, keep it off the event loop
+    if not user or not await auth_executor.run(verify_password, login_request.password, user.password_hash):
         SecurityService.log_login_attempt(
             db, request, login_request.username, False, "Invalid credentials"
         )
@@ -1,7 +1,7 @@
 """Dashboard API endpoints."""
 from typing import List, Optional, Dict
 from datetime import datetime
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from ...core.database import get_db
@@ -9,7 +9,9 @@ from ...core.dependencies import get_current_user, get_user_permissions
 from ...models.user import User
 from ...models.account import AccountConfig
 from ...services.valar_service import valar_service
-from ...services import valar_api
+from ...services.balance_pyramid import auto_resolution
+from ...utils.downsample import downsample
+from ...utils.encoded_responses import encoded_responses
 
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
@@ -43,19 +45,24 @@ class AccountSummary(BaseModel):
 
 
 class AccountHistoryPoint(BaseModel):
-    """Account history data point."""
+    """Account history data point (bars also carry open/high/low)."""
     updatetime: str
     balance: float
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
 
 
 class AccountHistoryData(BaseModel):
     """Account history response model."""
     account_id: str
     data: List[AccountHistoryPoint]
+    resolution: str = "raw"
 
 
 @router.get("/summary", response_model=DashboardSummary)
 async def get_dashboard_summary(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     accounts: Optional[List[str]] = Query(None, description="Specific accounts to query")
@@ -97,14 +104,21 @@ async def get_dashboard_summary(
         if account_id not in initial_capitals:
             initial_capitals[account_id] = 0.0
 
-    # Get summary from Valar service
-    summary = await valar_service.get_dashboard_summary(accounts, initial_capitals)
+    async def build():
+        # Get summary from Valar service
+        summary = await valar_service.get_dashboard_summary(accounts, initial_capitals)
+        return DashboardSummary(**summary).model_dump(exclude={"update_time"})
 
-    return DashboardSummary(**summary)
+    # Initial capitals come from the database, so they are part of the key; the time is stamped per response
+    key = ("dashboard/summary", tuple(accounts), tuple(initial_capitals.items()))
+    content_version = valar_service.get_content_version(accounts, "accounts")
+    fields = {"update_time": datetime.now().isoformat()}
+    return await encoded_responses.respond(request, key, content_version, build, fields)
 
 
 @router.get("/accounts", response_model=List[AccountSummary])
 async def get_accounts_detail(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     accounts: Optional[List[str]] = Query(None, description="Specific accounts to query")
@@ -139,14 +153,20 @@ async def get_accounts_detail(
         if account_id not in initial_capitals:
             initial_capitals[account_id] = 0.0
 
-    # Get account summaries from Valar service
-    summaries = await valar_service.get_account_summary(accounts, initial_capitals)
+    async def build():
+        # Get account summaries from Valar service
+        summaries = await valar_service.get_account_summary(accounts, initial_capitals)
 
-    # Add account names
-    for summary in summaries:
-        summary["account_name"] = account_names.get(summary["account_id"])
+        # Add account names
+        for summary in summaries:
+            summary["account_name"] = account_names.get(summary["account_id"])
+        return summaries
 
-    return [AccountSummary(**s) for s in summaries]
+    # Rows are built column-wise already, skip per-row model validation; names and
+    # capitals come from the database, so they are part of the key
+    key = ("dashboard/accounts", tuple(accounts), tuple(initial_capitals.items()), tuple(account_names.items()))
+    content_version = valar_service.get_content_version(accounts, "accounts")
+    return await encoded_responses.respond(request, key, content_version, build)
 
 
 @router.get("/history", response_model=List[AccountHistoryData])
@@ -154,7 +174,10 @@ async def get_accounts_history(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     accounts: Optional[List[str]] = Query(None, description="Specific accounts to query"),
-    days: int = Query(5, description="Number of days to query", ge=1, le=30)
+    days: int = Query(5, description="Number of days to query", ge=1, le=365),
+    resolution: str = Query("auto", description="raw, 1m, 5m, 1h, 1d or auto (raw up to 30 days, bars beyond)", pattern="^(auto|raw|1m|5m|1h|1d)$"),
+    max_points: Optional[int] = Query(None, description="Downsample each series to at most this many points", ge=3, le=20000),
+    method: str = Query("lttb", description="Downsampling method: lttb or minmax", pattern="^(lttb|minmax)$")
 ):
     """Get account balance history for the specified accounts and days."""
     # Get user permissions first
@@ -170,37 +193,53 @@ async def get_accounts_history(
     if not accounts:
         return []
 
-    # Get history data for each account
+    if resolution == "auto":
+        resolution = auto_resolution(days)
+
+    # Get history data for all accounts in one query, off the event loop
+    histories = await valar_service.get_accounts_history(accounts, days, resolution)
+
     history_data = []
     for account_id in accounts:
-        try:
-            # Get account history from valar API
-            history_df = valar_api.get_account_his(account_id, days=days)
-
-            if not history_df.empty:
-                # Convert DataFrame to list of data points
-                data_points = []
-                for timestamp, row in history_df.iterrows():
-                    data_points.append(AccountHistoryPoint(
-                        updatetime=timestamp.isoformat(),
-                        balance=float(row['balance'])
-                    ))
-
-                history_data.append(AccountHistoryData(
-                    account_id=account_id,
-                    data=data_points
-                ))
-            else:
-                # Empty data for account
-                history_data.append(AccountHistoryData(
-                    account_id=account_id,
-                    data=[]
-                ))
-        except Exception as e:
-            # Skip accounts with errors silently
+        history_df = histories.get(account_id)
+        if history_df is None or history_df.empty:
+            # Empty data for account (no samples or query error)
             history_data.append(AccountHistoryData(
                 account_id=account_id,
-                data=[]
+                data=[],
+                resolution=resolution
             ))
-
-    return history_data
\ No newline at end of file
+            continue
+
+        # Downsample before building the response models
+        if max_points and len(history_df) > max_points:
+            keep = downsample(history_df.index.asi8, history_df["balance"].to_numpy(), max_points, method)
+            history_df = history_df.iloc[keep]
+
+        # Convert DataFrame to list of data points
+        if resolution == "raw":
+            data_points = [
+                AccountHistoryPoint(updatetime=timestamp.isoformat(), balance=float(balance))
+                for timestamp, balance in zip(history_df.index, history_df["balance"])
+            ]
+        else:
+            data_points = [
+                AccountHistoryPoint(
+                    updatetime=timestamp.isoformat(),
+                    balance=float(close),
+                    open=float(open_),
+                    high=float(high),
+                    low=float(low)
+                )
+                for timestamp, open_, high, low, close in zip(
+                    history_df.index, history_df["open"], history_df["high"], history_df["low"], history_df["close"]
+                )
+            ]
+
+        history_data.append(AccountHistoryData(
+            account_id=account_id,
+            data=data_points,
+            resolution=resolution
+        ))
+
+    return history_data
@@ -1,14 +1,16 @@
 """Orders API endpoints."""
 from typing import List, Optional
 from datetime import date
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from ...core.database import get_db
 from ...core.dependencies import get_current_user, get_user_permissions
 from ...models.user import User
 from ...services.valar_service import valar_service
-import valar as va
+from ...services.trading_calendar import trading_calendar
+from ...utils.encoded_responses import encoded_responses
+from ...utils.json_response import FastJSONResponse
 
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
@@ -17,19 +19,21 @@ router = APIRouter(prefix="/orders", tags=["Orders"])
 @router.get("/current-date")
 async def get_current_trade_date():
     """Get current trading date."""
-    current_date = va.tradedate_now().isoformat()
+    current_date = trading_calendar.tradedate().isoformat()
     return {"current_date": current_date}
 
 
 @router.get("")
 async def get_orders(
+    request: Request,
     tradedate: Optional[str] = Query(None, description="Trade date (YYYY-MM-DD)"),
     is_special: Optional[bool] = Query(None, description="Get only special status orders"),
     accounts: Optional[List[str]] = Query(None, description="Account IDs to query"),
+    since: Optional[int] = Query(None, ge=0, description="Return only rows changed since this data version"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get orders for specified accounts."""
+    """Get orders for specified accounts, or only the changes since a data version."""
     # If no accounts specified, return empty result
     if not accounts or len(accounts) == 0:
         return {"orders": []}
@@ -41,14 +45,26 @@ async def get_orders(
     if not target_accounts:
         return {"orders": []} 
 
-    # Always use multi function for consistent data structure
-    orders = await valar_service.get_orders_multi(target_accounts, tradedate, is_special)
+    if since is not None:
+        changes = await valar_service.get_changes(target_accounts, "orders", since, tradedate, is_special)
+        if changes is not None:
+            return FastJSONResponse({**changes, "accounts": target_accounts})
 
-    return {"orders": orders, "accounts": target_accounts}
+    # Full list; the versions are read first so they never claim newer data than returned
+    version = valar_service.get_data_version(target_accounts, "orders", tradedate)
+    content_version = valar_service.get_content_version(target_accounts, "orders", tradedate)
+
+    async def build():
+        orders = await valar_service.get_orders_multi(target_accounts, tradedate, is_special)
+        return {"orders": orders, "accounts": target_accounts, "full": True}
+
+    key = ("orders", tuple(target_accounts), tradedate, is_special)
+    return await encoded_responses.respond(request, key, content_version, build, {"version": version})
 
 
 @router.get("/special")
 async def get_special_orders(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     accounts: Optional[List[str]] = Query(None, description="Specific account IDs")
@@ -66,20 +82,24 @@ async def get_special_orders(
     if not target_accounts:
         return {"orders": []}
 
-    # Get special orders from Valar service
-    orders = await valar_service.get_special_orders(target_accounts)
+    async def build():
+        # Get special orders from Valar service
+        return {"orders": await valar_service.get_special_orders(target_accounts)}
 
-    return {"orders": orders}
+    content_version = valar_service.get_content_version(target_accounts, "orders")
+    return await encoded_responses.respond(request, ("orders/special", tuple(target_accounts)), content_version, build)
 
 
 @router.get("/trades")
 async def get_trades(
+    request: Request,
     trade_date: Optional[str] = Query(None, description="Trade date (YYYY-MM-DD)"),
     accounts: Optional[List[str]] = Query(None, description="Account IDs to query"),
+    since: Optional[int] = Query(None, ge=0, description="Return only rows changed since this data version"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get trades for specified accounts."""
+    """Get trades for specified accounts, or only the changes since a data version."""
     # If no accounts specified, return empty result
     if not accounts or len(accounts) == 0:
         return {"trades": []}
@@ -91,7 +111,18 @@ async def get_trades(
     if not target_accounts:
         return {"trades": []}
 
-    # Always use multi function for consistent data structure
-    trades = await valar_service.get_trades_multi(target_accounts, trade_date)
+    if since is not None:
+        changes = await valar_service.get_changes(target_accounts, "trades", since, trade_date)
+        if changes is not None:
+            return FastJSONResponse({**changes, "accounts": target_accounts})
+
+    # Full list; the versions are read first so they never claim newer data than returned
+    version = valar_service.get_data_version(target_accounts, "trades", trade_date)
+    content_version = valar_service.get_content_version(target_accounts, "trades", trade_date)
+
+    async def build():
+        trades = await valar_service.get_trades_multi(target_accounts, trade_date)
+        return {"trades": trades, "accounts": target_accounts, "full": True}
 
-    return {"trades": trades, "accounts": target_accounts}
\ No newline at end of file
+    key = ("orders/trades", tuple(target_accounts), trade_date)
+    return await encoded_responses.respond(request, key, content_version, build, {"version": version})
\ No newline at end of file
@@ -1,12 +1,15 @@
 """Positions API endpoints."""
+from datetime import datetime
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from ...core.database import get_db
 from ...core.dependencies import get_current_user, get_user_permissions
 from ...models.user import User
 from ...services.valar_service import valar_service
+from ...utils.encoded_responses import encoded_responses
+from ...utils.json_response import FastJSONResponse
 
 
 router = APIRouter(prefix="/positions", tags=["Positions"])
@@ -16,15 +19,19 @@ class PositionsResponse(BaseModel):
     """Positions response model."""
     positions: List[Dict[str, Any]]
     update_time: str
+    version: Optional[int] = None
+    full: bool = True
 
 
 @router.get("", response_model=PositionsResponse)
 async def get_positions(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    accounts: Optional[List[str]] = Query(None, description="Account IDs to query")
+    accounts: Optional[List[str]] = Query(None, description="Account IDs to query"),
+    since: Optional[int] = Query(None, ge=0, description="Return only rows changed since this data version")
 ):
-    """Get positions for specified accounts."""
+    """Get positions for specified accounts, or only the changes since a data version."""
     # If no accounts specified, return empty result
     if not accounts or len(accounts) == 0:
         return PositionsResponse(positions=[], update_time="")
@@ -36,14 +43,28 @@ async def get_positions(
     if not target_accounts:
         return PositionsResponse(positions=[], update_time="")
 
-    # Get positions from Valar service
-    result = await valar_service.get_positions(target_accounts)
+    if since is not None:
+        changes = await valar_service.get_changes(target_accounts, "positions", since)
+        if changes is not None:
+            return FastJSONResponse(changes)
 
-    return PositionsResponse(**result)
+    # Get positions from Valar service; the versions are read first so they never claim newer data
+    version = valar_service.get_data_version(target_accounts, "positions")
+    content_version = valar_service.get_content_version(target_accounts, "positions")
+
+    async def build():
+        result = await valar_service.get_positions(target_accounts)
+        return {"positions": result["positions"], "full": True}
+
+    # Encoded once per data change for everyone with these accounts, skips response model validation;
+    # the time and version are stamped on each response
+    fields = {"update_time": datetime.now().isoformat(), "version": version}
+    return await encoded_responses.respond(request, ("positions", tuple(target_accounts)), content_version, build, fields)
 
 
 @router.get("/summary")
 async def get_positions_summary(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -57,10 +78,13 @@ async def get_positions_summary(
     # Use the user's permitted accounts
     accounts = user_permissions
 
-    # Get positions from Valar service
-    result = await valar_service.get_positions(accounts)
+    async def build():
+        # Get positions from Valar service
+        result = await valar_service.get_positions(accounts)
 
-    # Add permitted accounts list to the response
-    result["permitted_accounts"] = accounts
+        # Add permitted accounts list to the response
+        return {"positions": result["positions"], "permitted_accounts": accounts}
 
-    return result
\ No newline at end of file
+    content_version = valar_service.get_content_version(accounts, "positions")
+    fields = {"update_time": datetime.now().isoformat()}
+    return await encoded_responses.respond(request, ("positions/summary", tuple(accounts)), content_version, build, fields)
\ No newline at end of file
@@ -6,6 +6,8 @@ from sqlalchemy import and_
 
 from ...core.database import get_db
 from ...core.dependencies import get_current_user
+from ...core.executors import auth_executor
+from ...core.shared_cache import shared_cache
 from ...models.user import User, UserRole
 from ...schemas.settings import (
     UserCreate,
@@ -60,7 +62,7 @@ async def create_user(
 
     user = User(
         username=user_data.username,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await auth_executor.run(get_password_hash, user_data.password),
         role=user_data.role,
         note1=user_data.note1,
         note2=user_data.note2,
@@ -68,6 +70,7 @@ async def create_user(
     )
     db.add(user)
     db.commit()
+    await shared_cache.invalidate("users")
     db.refresh(user)
 
     return user
@@ -111,12 +114,13 @@ async def update_user(
     for field, value in update_data.items():
         if field == "password" and value:
             # 如果提供了新密码，进行哈希处理
-            user.password_hash = get_password_hash(value)
+            user.password_hash = await auth_executor.run(get_password_hash, value)
         elif field != "password":
             # 其他字段直接设置
             setattr(user, field, value)
 
     db.commit()
+    await shared_cache.invalidate("users")
     db.refresh(user)
 
     return user
@@ -150,6 +154,7 @@ async def delete_user(
 
     db.delete(user)
     db.commit()
+    await shared_cache.invalidate("users")
 
     return {"message": "用户删除成功"}
 
@@ -175,7 +180,7 @@ async def reset_user_password(
             detail="用户不存在"
         )
 
-    user.password_hash = get_password_hash(password_data.new_password)
+    user.password_hash = await auth_executor.run(get_password_hash, password_data.new_password)
     db.commit()
 
     return {"message": "密码重置成功"}
@@ -207,14 +212,14 @@ async def change_password(
 ):
     """修改密码"""
     # 验证原密码
-    if not verify_password(password_data.old_password, current_user.password_hash):
+    if not await auth_executor.run(verify_password, password_data.old_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="原密码错误"
         )
 
     # 更新密码
-    current_user.password_hash = get_password_hash(password_data.new_password)
+    current_user.password_hash = await auth_executor.run(get_password_hash, password_data.new_password)
     db.commit()
 
     return {"message": "密码修改成功"}
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""WebSocket push channel for account summaries, positions and orders."""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
+
+from ...core.executors import ExecutorBusy, auth_executor
+from ...core.security import verify_token
+from ...services.push_hub import TOPICS, Subscriber, SubscriptionRevoked, load_permitted, push_hub
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/stream", tags=["Stream"])
+
+
+def _authenticate(token: Optional[str]):
+    """Resolve the token to an active user, their permitted accounts and the token expiry, None if invalid."""
+    payload = verify_token(token) if token else None
+    if payload is None or payload.get("sub") is None:
+        return None
+    user_id = int(payload["sub"])
+    permitted = load_permitted([user_id]).get(user_id)
+    if permitted is None:
+        return None
+    return user_id, permitted, payload.get("exp")
+
+
+def _invalid(message) -> Optional[str]:
+    """Why a client message is malformed, None if it is well-formed."""
+    if not isinstance(message, dict):
+        return "Invalid message"
+    if not isinstance(message.get("topic"), str):
+        return "topic must be a string"
+    accounts = message.get("accounts")
+    if accounts is not None and not (isinstance(accounts, list) and all(isinstance(a, str) for a in accounts)):
+        return "accounts must be a list of account IDs"
+    if message.get("is_special") is not None and not isinstance(message.get("is_special"), bool):
+        return "is_special must be true, false or null"
+    return None
+
+
+@router.websocket("")
+async def stream(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """
+    Push updates of subscribed topics for the user's permitted accounts.
+
+    Browsers cannot set headers on WebSocket requests, so the access token is
+    passed as the ``token`` query parameter. Client messages:
+
+    - ``{"action": "subscribe", "topic": "accounts|positions|orders", "accounts": [...], "is_special": null}``
+    - ``{"action": "unsubscribe", "topic": "..."}``
+
+    The server sends ``{"type": "update", "topic": ..., "data": ...}`` with the
+    same data as the REST endpoints, only when it changed. Malformed messages
+    and a busy server get an ``{"type": "error"}`` frame. The connection is
+    closed when the token expires or the user is deactivated (1008) or on an
+    unexpected server error (1011), and subscriptions shrink when account
+    permissions are revoked.
+    """
+    identity = await auth_executor.run(_authenticate, token)
+    if identity is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    user_id, permitted, expires_at = identity
+    subscriber = Subscriber(websocket, user_id, permitted)
+    push_hub.register(subscriber)
+    expiry = None
+    if expires_at is not None:
+        expiry = asyncio.get_running_loop().call_later(max(expires_at - time.time(), 0), subscriber.revoke, "Token expired")
+    sender = asyncio.create_task(push_hub.send_loop(subscriber))
+    receive = None
+    try:
+        while True:
+            receive = asyncio.create_task(websocket.receive_text())
+            done, _ = await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                # Stalled or closed while sending
+                receive.cancel()
+                sender.result()
+            try:
+                message = orjson.loads(receive.result())
+            except orjson.JSONDecodeError:
+                message = None
+            detail = _invalid(message)
+            if detail is not None:
+                subscriber.reply({"type": "error", "detail": detail})
+                continue
+            action, topic = message.get("action"), message["topic"]
+            if topic not in TOPICS:
+                subscriber.reply({"type": "error", "detail": f"Unknown topic: {topic}"})
+            elif action == "subscribe":
+                accounts = push_hub.subscribe(
+                    subscriber, topic, message.get("accounts"), message.get("is_special")
+                )
+                subscriber.reply({"type": "subscribed", "topic": topic, "accounts": accounts})
+                try:
+                    await push_hub.send_current(subscriber, topic)
+                except ExecutorBusy:
+                    # Still subscribed; the current state follows with the next change
+                    subscriber.reply({"type": "error", "topic": topic, "detail": "Server busy, current state delayed"})
+            elif action == "unsubscribe":
+                push_hub.unsubscribe(subscriber, topic)
+                subscriber.reply({"type": "unsubscribed", "topic": topic})
+            else:
+                subscriber.reply({"type": "error", "detail": f"Unknown action: {action}"})
+    except WebSocketDisconnect:
+        pass
+    except asyncio.TimeoutError:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    except SubscriptionRevoked as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+    except Exception as e:
+        logger.error(f"Error in stream of user {user_id}: {e}")
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    finally:
+        if expiry is not None:
+            expiry.cancel()
+        sender.cancel()
+        if receive is not None:
+            receive.cancel()
+        push_hub.unregister(subscriber)
+        # Retrieve the sender's outcome (e.g. a send after the close) so it is not reported as unhandled
+        sender.add_done_callback(lambda task: task.cancelled() or task.exception())
@@ -0,0 +1,31 @@
+"""System status endpoints."""
+from fastapi import APIRouter, Depends
+
+from ...core.dependencies import get_current_admin
+from ...core.executors import get_executor_stats, process_offload
+from ...core.mongo import get_pool_stats
+from ...core.shared_cache import shared_cache
+from ...utils.encoded_responses import encoded_responses
+from ...services.valar_service import valar_service
+from ...services.push_hub import push_hub
+from ...models.user import User
+
+
+router = APIRouter(prefix="/system", tags=["System"])
+
+
+@router.get("/stats")
+async def get_system_stats(current_user: User = Depends(get_current_admin)):
+    """Runtime statistics for sizing pools and caches (admin only)."""
+    return {
+        "mongo_pool": get_pool_stats(),
+        "snapshot": valar_service.snapshots.stats(),
+        "live_book": valar_service.live_book.stats(),
+        "push": push_hub.stats(),
+        "single_flight": valar_service.single_flight.stats(),
+        "response_cache": valar_service.response_cache.stats(),
+        "shared_cache": shared_cache.stats(),
+        "encoded_responses": encoded_responses.stats(),
+        "executors": get_executor_stats(),
+        "process_offload": process_offload.stats(),
+    }
@@ -45,7 +45,78 @@ class Settings(BaseSettings):
     DATA_DIR: Path = BASE_DIR / "data"
 
     # MongoDB
-    VALAR_MONGO_CONNECTION: str = "CLOUD"
+    # valar connection profile; "VALAR" is the profile valar_api always defaulted to
+    VALAR_MONGO_CONNECTION: str = "VALAR"
+    # Optional direct URI; when set the app owns a pool sized by the MONGO_* options
+    VALAR_MONGO_URI: str = ""
+    VALAR_MONGO_DB: str = "VALAR"
+    MONGO_MAX_POOL_SIZE: int = 50
+    MONGO_MIN_POOL_SIZE: int = 4
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_WARM_ON_STARTUP: bool = True
+    # "thread": sync valar_api in worker threads; "async": asyncio driver (needs VALAR_MONGO_URI)
+    VALAR_DATA_BACKEND: str = "thread"
+    # Decode query results straight into Arrow tables when pymongoarrow is installed
+    VALAR_ARROW_DECODE: bool = True
+    # "poll": query Mongo per read; "change_stream": serve reads from an in-memory
+    # book fed by change streams (needs VALAR_MONGO_URI and a replica set)
+    VALAR_INGEST_MODE: str = "poll"
+
+    # Balance history cache
+    HISTORY_CACHE_DAYS: int = 30
+    HISTORY_REFRESH_SECONDS: float = 1.0
+
+    # Background snapshot of all configured accounts served to every user
+    SNAPSHOT_ENABLED: bool = True
+    SNAPSHOT_REFRESH_SECONDS: float = 1.0
+    # Older snapshots are not served; requests query Mongo directly instead
+    SNAPSHOT_MAX_AGE_SECONDS: float = 5.0
+    # Versions kept for delta sync (since=); older versions get a full reload
+    SNAPSHOT_HISTORY: int = 120
+    # WebSocket clients that cannot take a message within this time are disconnected
+    PUSH_SEND_TIMEOUT_SECONDS: float = 10.0
+
+    # Read cache in front of Mongo queries, TTL per dataset (0 disables it for the dataset)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    # Expired entries are served this much longer while they are refreshed in the background
+    RESPONSE_CACHE_MAX_STALE_SECONDS: float = 30.0
+    RESPONSE_CACHE_TTL_ACCOUNTS: float = 1.0
+    RESPONSE_CACHE_TTL_POSITIONS: float = 1.0
+    RESPONSE_CACHE_TTL_ORDERS: float = 3.0
+    RESPONSE_CACHE_TTL_TRADES: float = 3.0
+    RESPONSE_CACHE_TTL_HISTORY: float = 60.0
+    # Encoded positions/dashboard/orders bodies reused until their data changes
+    ENCODED_RESPONSE_CACHE_ENTRIES: int = 512
+    # Shared bodies at least this large are also served gzip-compressed
+    RESPONSE_GZIP_MIN_BYTES: int = 1024
+
+    # local (default) or redis: share cached results across workers and hosts
+    CACHE_BACKEND: str = "local"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    SHARED_CACHE_PREFIX: str = "valar"
+    # Workers missing a shared entry wait this long for the worker loading it
+    SHARED_CACHE_LOCK_SECONDS: float = 5.0
+    # Permission lookups are cached per worker and dropped on account/user changes;
+    # only used with the redis backend, which carries those changes to every worker
+    PERMISSION_CACHE_SECONDS: float = 30.0
+
+    # Threads and maximum waiting calls per workload class; calls beyond the queue fail fast
+    EXECUTOR_REALTIME_WORKERS: int = 8
+    EXECUTOR_REALTIME_QUEUE: int = 64
+    EXECUTOR_HISTORY_WORKERS: int = 4
+    EXECUTOR_HISTORY_QUEUE: int = 32
+    EXECUTOR_ANALYTICS_WORKERS: int = 2
+    EXECUTOR_ANALYTICS_QUEUE: int = 16
+    EXECUTOR_AUTH_WORKERS: int = 2
+    EXECUTOR_AUTH_QUEUE: int = 32
+    # Worker processes for transforms of large Arrow results (0 disables) and the row count that qualifies
+    PROCESS_OFFLOAD_WORKERS: int = 0
+    PROCESS_OFFLOAD_MIN_ROWS: int = 100_000
+
+    # Trading days preloaded into the trading calendar
+    TRADING_CALENDAR_DAYS: int = 400
 
     @field_validator("ALLOWED_ORIGINS", "CORS_ORIGINS", mode="before")
     @classmethod
@@ -14,20 +14,23 @@ if db_url.startswith("sqlite:///./"):
     db_path.parent.mkdir(parents=True, exist_ok=True)
     db_url = f"sqlite:///{db_path}"
 
-# Create SQLite engine
+is_sqlite = db_url.startswith("sqlite")
+
+# Create engine; the thread check and pragma only apply to SQLite
 engine = create_engine(
     db_url,
-    connect_args={"check_same_thread": False},
+    connect_args={"check_same_thread": False} if is_sqlite else {},
     echo=settings.DEBUG
 )
 
 
 # Enable foreign key constraints for SQLite
-@event.listens_for(engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+if is_sqlite:
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 
 # Create SessionLocal class
@@ -1,16 +1,23 @@
 """Dependencies for FastAPI endpoints."""
-from typing import Optional, List
+import time
+from typing import Optional, List, Dict, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from .database import get_db
+from .config import settings
 from .security import verify_token
+from .shared_cache import shared_cache
 from ..models.user import User, UserRole
 from ..models.permission import AccountPermission
 
 # Security scheme
 security = HTTPBearer()
 
+# (user id, role) -> (loaded at, permitted account IDs); dropped on account, permission or user changes
+_permission_cache: Dict[Tuple[int, object], Tuple[float, List[str]]] = {}
+shared_cache.add_listener(lambda scope: _permission_cache.clear())
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -71,6 +78,20 @@ async def get_current_admin(
 
 def get_user_permissions(user: User, db: Session) -> List[str]:
     """Get list of account IDs that user has permission to access."""
+    # Only the redis backend tells every worker about permission changes; with
+    # per-worker caches another worker could keep serving revoked accounts
+    if not shared_cache.enabled or settings.PERMISSION_CACHE_SECONDS <= 0:
+        return _load_user_permissions(user, db)
+    key = (user.id, user.role)
+    cached = _permission_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < settings.PERMISSION_CACHE_SECONDS:
+        return list(cached[1])
+    account_ids = _load_user_permissions(user, db)
+    _permission_cache[key] = (time.monotonic(), account_ids)
+    return list(account_ids)
+
+
+def _load_user_permissions(user: User, db: Session) -> List[str]:
     user_role = user.role
     if isinstance(user_role, str):
         try:
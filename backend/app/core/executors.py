@@ -0,0 +1,215 @@
+"""Bounded executors isolating blocking work by workload class."""
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import settings
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when a workload class already has its maximum of calls waiting."""
+
+
+# Executor whose run_async call the current task is inside; its nested run calls are already admitted
+_admitted: contextvars.ContextVar[Optional["BoundedExecutor"]] = contextvars.ContextVar("bounded_executor_admitted", default=None)
+
+
+class BoundedExecutor:
+    """
+    Thread pool of one workload class with a cap on waiting calls.
+
+    Each class gets its own threads, so a burst in one (e.g. long history
+    queries) cannot occupy the threads another needs (e.g. real-time
+    positions). Once ``workers + max_queue`` calls are pending, new calls
+    fail fast with ExecutorBusy instead of queueing without bound. The time
+    calls wait for a thread is kept for the stats.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = 0
+        self._waits: deque = deque(maxlen=1024)
+        self._stats = {"submitted": 0, "started": 0, "rejected": 0}
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run blocking ``fn(*args)`` on this class's threads."""
+        # Inside run_async of this class the call already holds a slot, so it is not counted twice
+        nested = _admitted.get() is self
+        if not nested:
+            self._admit()
+        submitted = time.monotonic()
+        waited: List[float] = []
+
+        def call():
+            waited.append(time.monotonic() - submitted)
+            return fn(*args)
+
+        # Like asyncio.to_thread, the call sees the caller's context variables
+        context = contextvars.copy_context()
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-executor")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, functools.partial(context.run, call))
+        finally:
+            if not nested:
+                self._release(waited)
+
+    async def run_async(self, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Await ``fn(*args)`` with at most ``workers`` of this class running, for asyncio-native I/O."""
+        self._admit()
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore, self._semaphore_loop = asyncio.Semaphore(self.workers), loop
+        submitted = time.monotonic()
+        waited: List[float] = []
+        try:
+            async with self._semaphore:
+                waited.append(time.monotonic() - submitted)
+                token = _admitted.set(self)
+                try:
+                    return await fn(*args)
+                finally:
+                    _admitted.reset(token)
+        finally:
+            self._release(waited)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict:
+        waits = sorted(self._waits)
+        return {
+            **self._stats,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": min(self._pending, self.workers),
+            "queued": max(self._pending - self.workers, 0),
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else None,
+                "p99": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 2) if waits else None,
+                "max": round(waits[-1] * 1000, 2) if waits else None,
+            },
+        }
+
+    def _admit(self) -> None:
+        if self._pending >= self.workers + self.max_queue:
+            self._stats["rejected"] += 1
+            raise ExecutorBusy(f"{self.name} executor is saturated ({self._pending} calls pending)")
+        self._pending += 1
+        self._stats["submitted"] += 1
+
+    def _release(self, waited: List[float]) -> None:
+        self._pending -= 1
+        # Calls cancelled while still waiting have no wait time
+        if waited:
+            self._waits.append(waited[0])
+            self._stats["started"] += 1
+
+
+class ProcessOffload:
+    """
+    Optional process pool for CPU-heavy transforms of large frames.
+
+    DataFrame transforms hold the GIL for much of their run, so on large days
+    they stall every other request thread of the worker. With ``workers > 0``
+    transforms of at least ``min_rows`` rows run in a separate process; the
+    calling thread (already on a bounded executor) only waits for the result,
+    with the GIL released. Inputs and results cross the process boundary as
+    Arrow IPC buffers. Processes are spawned rather than forked, so they never
+    inherit the server's threads or connections. A crashed worker breaks the
+    pool: it is replaced on the next call and the caller runs the transform
+    itself.
+    """
+
+    def __init__(self, workers: int, min_rows: int):
+        self.workers = workers
+        self.min_rows = min_rows
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._durations: deque = deque(maxlen=1024)
+        self._stats = {"offloaded": 0, "rows": 0, "failures": 0}
+
+    def accepts(self, rows: int) -> bool:
+        """Whether a transform of ``rows`` rows should run in the pool."""
+        return self.workers > 0 and rows >= self.min_rows
+
+    def call(self, rows: int, fn: Callable[..., Any], *args) -> Any:
+        """Run picklable ``fn(*args)`` in a worker process and block until it returns."""
+        started = time.monotonic()
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            pool = self._pool
+        try:
+            result = pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            with self._lock:
+                self._stats["failures"] += 1
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        with self._lock:
+            self._durations.append(time.monotonic() - started)
+            self._stats["offloaded"] += 1
+            self._stats["rows"] += rows
+        return result
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        durations = sorted(self._durations)
+        return {
+            **self._stats,
+            "enabled": self.workers > 0,
+            "workers": self.workers,
+            "min_rows": self.min_rows,
+            "started": self._pool is not None,
+            "duration_ms": {
+                "avg": round(sum(durations) / len(durations) * 1000, 2) if durations else None,
+                "max": round(durations[-1] * 1000, 2) if durations else None,
+            },
+        }
+
+
+# Live accounts, positions, orders and trades, and the account config reads that go with them
+realtime_executor = BoundedExecutor("realtime", settings.EXECUTOR_REALTIME_WORKERS, settings.EXECUTOR_REALTIME_QUEUE)
+# Balance history queries and balance bar reads
+history_executor = BoundedExecutor("history", settings.EXECUTOR_HISTORY_WORKERS, settings.EXECUTOR_HISTORY_QUEUE)
+# CPU-bound aggregation: balance bar roll-ups and delta diffs
+analytics_executor = BoundedExecutor("analytics", settings.EXECUTOR_ANALYTICS_WORKERS, settings.EXECUTOR_ANALYTICS_QUEUE)
+# Password hashing and WebSocket authentication
+auth_executor = BoundedExecutor("auth", settings.EXECUTOR_AUTH_WORKERS, settings.EXECUTOR_AUTH_QUEUE)
+
+EXECUTORS = (realtime_executor, history_executor, analytics_executor, auth_executor)
+
+# Order, trade and balance history transforms of large Arrow results
+process_offload = ProcessOffload(settings.PROCESS_OFFLOAD_WORKERS, settings.PROCESS_OFFLOAD_MIN_ROWS)
+
+
+def get_executor_stats() -> Dict[str, Dict]:
+    return {executor.name: executor.stats() for executor in EXECUTORS}
+
+
+def shutdown_executors() -> None:
+    for executor in EXECUTORS:
+        executor.shutdown()
+    process_offload.shutdown()
@@ -0,0 +1,213 @@
+"""MongoDB connection pool shared by all Valar data access."""
+import logging
+import threading
+from typing import Dict, Optional
+
+import pymongo
+from pymongo import monitoring
+from pymongo.database import Database
+from pymongo.asynchronous.database import AsyncDatabase
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Count connection pool events so the pool can be sized from real traffic."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "created": 0,
+            "closed": 0,
+            "checked_out": 0,
+            "checked_in": 0,
+            "checkout_failed": 0,
+            "pool_cleared": 0,
+        }
+
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["open"] = stats["created"] - stats["closed"]
+        stats["in_use"] = stats["checked_out"] - stats["checked_in"]
+        return stats
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr("pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr("checkout_failed")
+
+    def connection_checked_out(self, event):
+        self._incr("checked_out")
+
+    def connection_checked_in(self, event):
+        self._incr("checked_in")
+
+
+pool_stats = PoolStatsListener()
+async_pool_stats = PoolStatsListener()
+
+_client: Optional[pymongo.MongoClient] = None
+_database: Optional[Database] = None
+_managed = False
+_lock = threading.Lock()
+
+_async_client: Optional[pymongo.AsyncMongoClient] = None
+_async_database: Optional[AsyncDatabase] = None
+
+
+def _create_database() -> Database:
+    """Create the long-lived database handle according to settings."""
+    global _client, _managed
+
+    if settings.VALAR_MONGO_URI:
+        client = pymongo.MongoClient(
+            settings.VALAR_MONGO_URI,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            appname=settings.APP_NAME,
+            event_listeners=[pool_stats],
+        )
+        _client = client
+        _managed = True
+        return client.get_default_database(default=settings.VALAR_MONGO_DB)
+
+    # No URI configured: reuse the client of the Valar connection profile,
+    # created once instead of on every call.
+    import valar as va
+    database = va.get_mongo_client(settings.VALAR_MONGO_CONNECTION)
+    _client = database.client
+    _managed = False
+    return database
+
+
+def get_database() -> Database:
+    """Return the shared Valar database handle, creating it on first use."""
+    global _database
+    if _database is None:
+        with _lock:
+            if _database is None:
+                _database = _create_database()
+    return _database
+
+
+def init_mongo() -> None:
+    """Open the shared pool and warm it up. Called from the app lifespan."""
+    try:
+        database = get_database()
+        if settings.MONGO_WARM_ON_STARTUP:
+            database.client.admin.command("ping")
+        logger.info("MongoDB pool ready (%s)", "managed" if _managed else "valar profile")
+    except Exception as e:
+        # Keep the app up; the pool is created lazily on the next request
+        logger.warning(f"MongoDB pool warm-up failed: {e}")
+
+
+def close_mongo() -> None:
+    """Close the shared pool. Called from the app lifespan on shutdown."""
+    global _client, _database, _managed
+    with _lock:
+        if _client is not None:
+            _client.close()
+            logger.info("MongoDB pool closed")
+        _client = None
+        _database = None
+        _managed = False
+
+
+def async_backend_enabled() -> bool:
+    """Whether ValarService should use the native asyncio data path."""
+    return settings.VALAR_DATA_BACKEND == "async" and bool(settings.VALAR_MONGO_URI)
+
+
+def get_async_database() -> AsyncDatabase:
+    """Return the shared asyncio database handle, creating it on first use.
+
+    The async client has to be built from VALAR_MONGO_URI since the valar
+    connection profiles only provide synchronous clients.
+    """
+    global _async_client, _async_database
+    if _async_database is None:
+        if not settings.VALAR_MONGO_URI:
+            raise RuntimeError("VALAR_MONGO_URI is required for the async data backend")
+        _async_client = pymongo.AsyncMongoClient(
+            settings.VALAR_MONGO_URI,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+            serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            appname=settings.APP_NAME,
+            event_listeners=[async_pool_stats],
+        )
+        _async_database = _async_client.get_default_database(default=settings.VALAR_MONGO_DB)
+    return _async_database
+
+
+async def init_async_mongo() -> None:
+    """Open and warm the asyncio pool when the async backend is selected."""
+    if settings.VALAR_DATA_BACKEND == "async" and not settings.VALAR_MONGO_URI:
+        logger.warning("VALAR_DATA_BACKEND=async needs VALAR_MONGO_URI, falling back to threads")
+        return
+    if not async_backend_enabled():
+        return
+    try:
+        database = get_async_database()
+        if settings.MONGO_WARM_ON_STARTUP:
+            await database.client.admin.command("ping")
+        logger.info("MongoDB asyncio pool ready")
+    except Exception as e:
+        logger.warning(f"MongoDB asyncio pool warm-up failed: {e}")
+
+
+async def close_async_mongo() -> None:
+    """Close the asyncio pool if it was opened."""
+    global _async_client, _async_database
+    if _async_client is not None:
+        await _async_client.close()
+        logger.info("MongoDB asyncio pool closed")
+    _async_client = None
+    _async_database = None
+
+
+def get_pool_stats() -> Dict:
+    """Return pool configuration and connection counters."""
+    return {
+        "initialized": _database is not None,
+        "managed": _managed,
+        "max_pool_size": settings.MONGO_MAX_POOL_SIZE if _managed else None,
+        "min_pool_size": settings.MONGO_MIN_POOL_SIZE if _managed else None,
+        "max_idle_time_ms": settings.MONGO_MAX_IDLE_TIME_MS if _managed else None,
+        "connections": pool_stats.snapshot() if _managed else None,
+        "backend": "async" if async_backend_enabled() else "thread",
+        "async_connections": async_pool_stats.snapshot() if _async_client is not None else None,
+    }
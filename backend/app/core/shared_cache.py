@@ -0,0 +1,192 @@
+"""Cache shared by all workers over the Redis protocol, with pub/sub invalidation."""
+import asyncio
+import hashlib
+import logging
+import pickle
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    # Optional dependency: without redis every worker keeps its own caches
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:
+    aioredis = None
+    RedisError = OSError
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """
+    Read-through cache shared by all workers and hosts.
+
+    With ``CACHE_BACKEND=redis`` results are pickled into Redis under
+    ``{prefix}:data:*`` with the TTL of their dataset. A worker that misses
+    takes a short lock on the key, so only one worker loads it from Mongo
+    while the others wait for the stored value; Mongo load stays flat as
+    workers are added. Any other backend, or Redis being unreachable, makes
+    every call load directly.
+
+    ``invalidate`` runs the local listeners, drops the shared entries and
+    publishes the scope on ``{prefix}:invalidate`` so listeners in every
+    other worker run too. Redis must be trusted, since values are pickled.
+    """
+
+    def __init__(self, url: str, prefix: str = "valar", lock_seconds: float = 5.0):
+        self.url = url
+        self.prefix = prefix
+        self.lock_seconds = lock_seconds
+        self.instance_id = uuid.uuid4().hex
+        self.client = None
+        self._listeners: List[Callable[[str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"hits": 0, "waits": 0, "loads": 0, "errors": 0, "invalidations_sent": 0, "invalidations_received": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    @property
+    def channel(self) -> str:
+        return f"{self.prefix}:invalidate"
+
+    async def start(self) -> None:
+        if settings.CACHE_BACKEND != "redis" or self.client is not None:
+            return
+        if aioredis is None:
+            logger.warning("CACHE_BACKEND=redis needs the redis package, caches stay per worker")
+            return
+        client = aioredis.from_url(self.url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        try:
+            await client.ping()
+        except RedisError as e:
+            # Keep the app up with per-worker caches
+            logger.warning(f"Shared cache unavailable, caches stay per worker: {e}")
+            await client.aclose()
+            return
+        self.client = client
+        self._task = asyncio.create_task(self._listen(), name="shared-cache-invalidation")
+        logger.info("Shared cache connected")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.info("Shared cache closed")
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Call ``listener(scope)`` whenever cached data of ``scope`` is invalidated in any worker."""
+        self._listeners.append(listener)
+
+    def stats(self) -> Dict:
+        return {**self._stats, "backend": "redis" if self.enabled else "local"}
+
+    async def get_or_load(self, key: Any, ttl: float, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Shared value of ``key``, loaded by one worker with ``load`` when missing."""
+        if self.client is None or ttl <= 0:
+            return await load()
+        data_key = self._data_key(key)
+        lock_key = f"{data_key}:lock"
+        try:
+            raw = await self.client.get(data_key)
+            if raw is not None:
+                self._stats["hits"] += 1
+                return pickle.loads(raw)
+            owner = await self.client.set(lock_key, self.instance_id, nx=True, px=int(self.lock_seconds * 1000))
+            if not owner:
+                raw = await self._wait_for(data_key)
+                if raw is not None:
+                    self._stats["waits"] += 1
+                    return pickle.loads(raw)
+        except RedisError as e:
+            self._stats["errors"] += 1
+            logger.error(f"Error reading shared cache: {e}")
+            return await load()
+
+        value = await load()
+        self._stats["loads"] += 1
+        try:
+            await self.client.set(data_key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), px=max(int(ttl * 1000), 1))
+            if owner:
+                await self.client.delete(lock_key)
+        except RedisError as e:
+            self._stats["errors"] += 1
+            logger.error(f"Error writing shared cache: {e}")
+        return value
+
+    async def invalidate(self, scope: str) -> None:
+        """Drop cached data of ``scope`` in this and every other worker."""
+        self._notify(scope)
+        if self.client is None:
+            return
+        try:
+            keys = [key async for key in self.client.scan_iter(match=f"{self.prefix}:data:*", count=1000)]
+            if keys:
+                await self.client.unlink(*keys)
+            await self.client.publish(self.channel, f"{self.instance_id}:{scope}")
+            self._stats["invalidations_sent"] += 1
+        except RedisError as e:
+            self._stats["errors"] += 1
+            logger.error(f"Error publishing cache invalidation: {e}")
+
+    def _data_key(self, key: Any) -> str:
+        # repr of frozen call arguments is stable across processes
+        return f"{self.prefix}:data:{hashlib.sha1(repr(key).encode()).hexdigest()}"
+
+    async def _wait_for(self, data_key: str) -> Optional[bytes]:
+        """Wait for the worker holding the lock to store the value, None if it does not in time."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_seconds
+        while loop.time() < deadline:
+            await asyncio.sleep(0.02)
+            raw = await self.client.get(data_key)
+            if raw is not None:
+                return raw
+        return None
+
+    def _notify(self, scope: str) -> None:
+        for listener in self._listeners:
+            try:
+                listener(scope)
+            except Exception as e:
+                logger.error(f"Error invalidating {scope} cache: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    while True:
+                        # Poll with a timeout: a blocking read would trip the client's socket timeout
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is None:
+                            continue
+                        sender, _, scope = message["data"].decode().partition(":")
+                        if sender != self.instance_id:
+                            self._stats["invalidations_received"] += 1
+                            self._notify(scope)
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                # Entries expire with their TTL meanwhile; listeners drop local copies on reconnect
+                self._stats["errors"] += 1
+                logger.error(f"Shared cache invalidation channel lost: {e}")
+                await asyncio.sleep(1.0)
+                self._notify("all")
+
+
+shared_cache = SharedCache(
+    settings.REDIS_URL,
+    prefix=settings.SHARED_CACHE_PREFIX,
+    lock_seconds=settings.SHARED_CACHE_LOCK_SECONDS,
+)
@@ -1,15 +1,22 @@
 """Main application entry point."""
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import logging
 from .core.config import settings
 from .core.database import engine, Base
-from .api.v1 import auth, dashboard, positions, orders, security
+from .api.v1 import auth, dashboard, positions, orders, security, stream, system
 from .api.v1 import settings as settings_api
 from .api.v1 import account_config
 from .models import User
 from .core.database import SessionLocal
+from .core.mongo import init_mongo, close_mongo, init_async_mongo, close_async_mongo
+from .core.shared_cache import shared_cache
+from .core.executors import ExecutorBusy, shutdown_executors
+from .services.trading_calendar import trading_calendar
+from .services.valar_service import valar_service
+from .services.push_hub import push_hub
 from .core.security import get_password_hash
 from .middleware.security_log import SecurityLogMiddleware
 
@@ -62,10 +69,40 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
 
+    # Open the shared MongoDB pool used by valar_api
+    init_mongo()
+    await init_async_mongo()
+
+    # Share cached results and invalidations with the other workers
+    await shared_cache.start()
+
+    # Load the trading calendar (~400 blocking valar calls) off the request path;
+    # a failed load is retried in the background
+    await trading_calendar.start()
+
+    # Follow the live collections through change streams instead of polling
+    if settings.VALAR_INGEST_MODE == "change_stream":
+        if settings.VALAR_MONGO_URI:
+            valar_service.live_book.start()
+        else:
+            logger.warning("VALAR_INGEST_MODE=change_stream needs VALAR_MONGO_URI, falling back to polling")
+
+    # Refresh the shared snapshot of all configured accounts in the background
+    if settings.SNAPSHOT_ENABLED:
+        valar_service.snapshots.start()
+    push_hub.start()
+
     yield
 
     # Shutdown
     logger.info("Shutting down application...")
+    await push_hub.stop()
+    await valar_service.snapshots.stop()
+    await valar_service.live_book.stop()
+    await shared_cache.stop()
+    await close_async_mongo()
+    close_mongo()
+    shutdown_executors()
 
 
 # Create FastAPI application
@@ -76,6 +113,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request: Request, exc: ExecutorBusy):
+    """A workload class is saturated: ask the client to retry instead of queueing."""
+    logger.warning(str(exc))
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -96,6 +144,8 @@ app.include_router(orders.router, prefix="/api/v1")
 app.include_router(settings_api.router, prefix="/api/v1/settings")
 app.include_router(account_config.router, prefix="/api/v1/account-config")
 app.include_router(security.router, prefix="/api/v1")
+app.include_router(system.router, prefix="/api/v1")
+app.include_router(stream.router, prefix="/api/v1")
 
 # Root endpoint
 @app.get("/")
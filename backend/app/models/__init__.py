@@ -4,5 +4,6 @@ from .permission import AccountPermission
 from .account import AccountConfig
 from .audit import AuditLog
 from .security_log import LoginAttempt, AccessLog, LoginBlock
+from .balance_bar import BalanceBar, BalancePyramidState
 
-__all__ = ["User", "AccountPermission", "AccountConfig", "AuditLog", "LoginAttempt", "AccessLog", "LoginBlock"]
\ No newline at end of file
+__all__ = ["User", "AccountPermission", "AccountConfig", "AuditLog", "LoginAttempt", "AccessLog", "LoginBlock", "BalanceBar", "BalancePyramidState"]
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""Pre-aggregated account balance bars."""
+from sqlalchemy import Column, String, Float, DateTime, Integer
+from ..core.database import Base
+
+
+class BalanceBar(Base):
+    """OHLC balance bar of one account at one resolution (1m/5m/1h/1d)."""
+
+    __tablename__ = "balance_bars"
+
+    account_id = Column(String(100), primary_key=True)
+    resolution = Column(String(4), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # bucket start
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    samples = Column(Integer, nullable=False, default=0)
+    first_at = Column(DateTime, nullable=False)  # time of the open sample
+    last_at = Column(DateTime, nullable=False)  # time of the close sample
+
+
+class BalancePyramidState(Base):
+    """Raw account_his range already rolled up into balance bars."""
+
+    __tablename__ = "balance_pyramid_state"
+
+    account_id = Column(String(100), primary_key=True)
+    covered_from = Column(String(19), nullable=False)  # "YYYY-MM-DD HH:MM:SS"
+    watermark = Column(String(19), nullable=False)  # latest ingested updatetime
@@ -0,0 +1,301 @@
+"""Multi-resolution OHLC balance bars maintained incrementally in the app database."""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+import pandas as pd
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import valar_api
+from ..core.database import SessionLocal
+from ..core.executors import analytics_executor, history_executor
+from ..models.balance_bar import BalanceBar, BalancePyramidState
+from .trading_calendar import trading_calendar
+from ..utils.keyed_locks import KeyedLocks
+
+logger = logging.getLogger(__name__)
+
+# Resolution name -> pandas offset alias used to floor sample times.
+# 1d bars are keyed by tradedate instead, so a night session and the day
+# session it belongs to (also over weekends) land in the same bar.
+RESOLUTIONS = {
+    "1m": "1min",
+    "5m": "5min",
+    "1h": "1h",
+    "1d": "1D",
+}
+
+_UPSERT_CHUNK = 500
+
+
+# Longest range /dashboard/history served as raw samples before bars existed
+RAW_MAX_DAYS = 30
+
+
+def auto_resolution(days: int) -> str:
+    """Raw samples for the ranges the API always served raw, bars for the longer ones."""
+    if days <= RAW_MAX_DAYS:
+        return "raw"
+    if days <= 120:
+        return "1h"
+    return "1d"
+
+
+def build_bars(account_id: str, frame: pd.DataFrame) -> List[dict]:
+    """Roll raw samples (indexed by updatetime) up into bars at every resolution."""
+    if frame.empty:
+        return []
+    samples = pd.DataFrame({
+        "balance": frame["balance"].to_numpy(dtype="float64"),
+        "at": frame.index.values.astype("datetime64[ns]"),
+    })
+    rows = []
+    for resolution, freq in RESOLUTIONS.items():
+        at = pd.DatetimeIndex(samples["at"])
+        if resolution == "1d":
+            bucket = pd.DatetimeIndex(trading_calendar.tradedates_of(at.values).astype("datetime64[ns]"))
+        else:
+            bucket = at.floor(freq)
+        bars = samples.groupby(bucket, sort=True).agg(
+            open=("balance", "first"),
+            high=("balance", "max"),
+            low=("balance", "min"),
+            close=("balance", "last"),
+            samples=("balance", "size"),
+            first_at=("at", "min"),
+            last_at=("at", "max"),
+        )
+        bars["account_id"] = account_id
+        bars["resolution"] = resolution
+        bars["bucket"] = bars.index
+        rows.extend(bars.to_dict("records"))
+    for row in rows:
+        for key in ("bucket", "first_at", "last_at"):
+            row[key] = pd.Timestamp(row[key]).to_pydatetime()
+    return rows
+
+
+_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+    "mysql": mysql_insert,
+    "mariadb": mysql_insert,
+}
+
+
+def _insert(dialect: str, table):
+    if dialect not in _INSERTS:
+        raise ValueError(f"Balance bars need SQLite, PostgreSQL or MySQL, not {dialect}")
+    return _INSERTS[dialect](table)
+
+
+def _merge_values(new, greatest, least) -> list:
+    """Column updates merging bar ``new`` into the stored bar; open/close come before first_at/last_at."""
+    return [
+        ("open", case((new.first_at < BalanceBar.first_at, new.open), else_=BalanceBar.open)),
+        ("close", case((new.last_at > BalanceBar.last_at, new.close), else_=BalanceBar.close)),
+        ("high", greatest(BalanceBar.high, new.high)),
+        ("low", least(BalanceBar.low, new.low)),
+        ("samples", BalanceBar.samples + new.samples),
+        ("first_at", least(BalanceBar.first_at, new.first_at)),
+        ("last_at", greatest(BalanceBar.last_at, new.last_at)),
+    ]
+
+
+def _upsert_statement(dialect: str):
+    """Insert bars, merging with existing ones regardless of ingestion order."""
+    stmt = _insert(dialect, BalanceBar)
+    if dialect in ("mysql", "mariadb"):
+        # MySQL applies the updates left to right, so order matters here
+        return stmt.on_duplicate_key_update(_merge_values(stmt.inserted, func.greatest, func.least))
+    if dialect == "postgresql":
+        greatest, least = func.greatest, func.least
+    else:
+        # SQLite's multi-argument max/min are scalar functions
+        greatest, least = func.max, func.min
+    return stmt.on_conflict_do_update(
+        index_elements=["account_id", "resolution", "bucket"],
+        set_=dict(_merge_values(stmt.excluded, greatest, least)),
+    )
+
+
+def _claim_statement(dialect: str, account_id: str, old: dict | None, new: dict):
+    """
+    Advance an account's state from ``old`` to ``new`` only if it is still ``old``.
+
+    Exactly one writer (task or worker process) wins each claim, so every
+    raw sample range is rolled up once even when several processes sync the
+    same account.
+    """
+    if old is None:
+        stmt = _insert(dialect, BalancePyramidState).values(account_id=account_id, **new)
+        if dialect in ("mysql", "mariadb"):
+            return stmt.prefix_with("IGNORE")
+        return stmt.on_conflict_do_nothing(index_elements=["account_id"])
+    return update(BalancePyramidState).where(
+        BalancePyramidState.account_id == account_id,
+        BalancePyramidState.covered_from == old["covered_from"],
+        BalancePyramidState.watermark == old["watermark"],
+    ).values(**new)
+
+
+class BalancePyramid:
+    """
+    Balance bars at 1m/5m/1h/1d kept in the app database.
+
+    Each account's raw account_his range is rolled up once. Afterwards only
+    samples newer than the account's watermark are fetched and merged into the
+    bars, so long-range charts are an indexed read of pre-aggregated rows.
+    Syncs lock only the accounts they touch; across worker processes the
+    state row is advanced with compare-and-set, and a worker that loses the
+    race drops its samples because the winner already wrote them.
+    """
+
+    def __init__(self, fetch: Callable[..., Awaitable[Any]], refresh_interval: float = 1.0):
+        self._fetch = fetch
+        self.refresh_interval = refresh_interval
+        self._refreshed_at: Dict[str, float] = {}
+        self._locks = KeyedLocks()
+
+    async def get(self, account_ids: List[str], days: int, resolution: str) -> Dict[str, pd.DataFrame]:
+        """Return bars since the start of ``days`` trading days, indexed by bucket."""
+        start = valar_api.account_his_start(days)
+        async with self._locks.hold(account_ids):
+            await self._sync(account_ids, start)
+        return await history_executor.run(self._read, account_ids, resolution, start)
+
+    async def _sync(self, account_ids: List[str], start: str) -> None:
+        states = await history_executor.run(self._load_states, account_ids)
+
+        # Roll up raw history not covered yet: whole window for new accounts,
+        # the missing head for accounts that were synced with a shorter range
+        gaps: Dict[str | None, List[str]] = {}
+        for account_id in account_ids:
+            state = states.get(account_id)
+            if state is None:
+                gaps.setdefault(None, []).append(account_id)
+            elif state["covered_from"] > start:
+                gaps.setdefault(state["covered_from"], []).append(account_id)
+        for end, accounts in gaps.items():
+            data = await self._fetch("get_account_his_range", accounts, start, end)
+            frames = valar_api.split_account_his_frame(data, accounts)
+            await analytics_executor.run(self._ingest, frames, start, states)
+            if end is None:
+                # A full load is already up to date
+                now = time.monotonic()
+                for account_id in accounts:
+                    self._refreshed_at[account_id] = now
+
+        # Merge samples newer than each watermark
+        now = time.monotonic()
+        due = [
+            a for a in account_ids
+            if now - self._refreshed_at.get(a, 0.0) >= self.refresh_interval
+        ]
+        # An account whose lost claim is not visible to this reader yet syncs on the next call
+        due = [a for a in due if states.get(a) is not None]
+        if due:
+            data = await self._fetch(
+                "get_account_his_after",
+                {a: states[a]["watermark"] for a in due},
+            )
+            # The fetch repeats the watermark second; bars sum samples, so only roll up newer ones
+            frames = {
+                account_id: frame[frame.index > pd.Timestamp(states[account_id]["watermark"])]
+                for account_id, frame in valar_api.split_account_his_frame(data, due).items()
+            }
+            await analytics_executor.run(self._ingest, frames, None, states)
+            for account_id in due:
+                self._refreshed_at[account_id] = now
+
+    def _load_states(self, account_ids: List[str]) -> Dict[str, dict]:
+        db = SessionLocal()
+        try:
+            rows = db.query(BalancePyramidState).filter(
+                BalancePyramidState.account_id.in_(account_ids)
+            ).all()
+            return {
+                row.account_id: {"covered_from": row.covered_from, "watermark": row.watermark}
+                for row in rows
+            }
+        finally:
+            db.close()
+
+    def _ingest(self, frames: Dict[str, pd.DataFrame], covered_from: str | None, states: Dict[str, dict]) -> None:
+        """Merge new samples into the bars and advance coverage in one transaction."""
+        db = SessionLocal()
+        try:
+            dialect = db.get_bind().dialect.name
+            claimed: Dict[str, dict] = {}
+            lost: Set[str] = set()
+            rows = []
+            for account_id, frame in frames.items():
+                old = states.get(account_id)
+                if old is None:
+                    state = {
+                        # Only samples after the watermark are rolled up, so start just before the window
+                        "covered_from": covered_from,
+                        "watermark": (pd.Timestamp(covered_from) - pd.Timedelta(seconds=1)).strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+                else:
+                    state = dict(old)
+                    if covered_from is not None:
+                        state["covered_from"] = min(state["covered_from"], covered_from)
+                if not frame.empty:
+                    latest = frame.index.max().strftime("%Y-%m-%d %H:%M:%S")
+                    state["watermark"] = max(state["watermark"], latest)
+                if state == old:
+                    continue
+                # Claim before writing bars so a concurrent writer blocks on the state row
+                if db.execute(_claim_statement(dialect, account_id, old, state)).rowcount != 1:
+                    lost.add(account_id)
+                    continue
+                claimed[account_id] = state
+                rows.extend(build_bars(account_id, frame))
+            stmt = _upsert_statement(dialect)
+            for i in range(0, len(rows), _UPSERT_CHUNK):
+                db.execute(stmt, rows[i:i + _UPSERT_CHUNK])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        states.update(claimed)
+        if lost:
+            # Another process ingested these ranges; continue from its state
+            logger.info(f"Balance bars of {sorted(lost)} were written by another process")
+            states.update(self._load_states(list(lost)))
+
+    def _read(self, account_ids: List[str], resolution: str, start: str) -> Dict[str, pd.DataFrame]:
+        start_at = pd.Timestamp(start)
+        if resolution == "1d":
+            # Daily bars of tradedates after the window start
+            since = BalanceBar.bucket > start_at.to_pydatetime()
+        else:
+            since = BalanceBar.bucket >= start_at.floor(RESOLUTIONS[resolution]).to_pydatetime()
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                BalanceBar.account_id,
+                BalanceBar.bucket,
+                BalanceBar.open,
+                BalanceBar.high,
+                BalanceBar.low,
+                BalanceBar.close,
+            ).filter(
+                BalanceBar.account_id.in_(account_ids),
+                BalanceBar.resolution == resolution,
+                since,
+            ).order_by(BalanceBar.account_id, BalanceBar.bucket).all()
+        finally:
+            db.close()
+
+        bars = pd.DataFrame(rows, columns=["accountid", "updatetime", "open", "high", "low", "close"])
+        bars["updatetime"] = pd.to_datetime(bars["updatetime"])
+        bars = bars.set_index("updatetime")
+        bars["balance"] = bars["close"]
+        return valar_api.split_account_his_frame(bars, account_ids)
@@ -0,0 +1,173 @@
+"""Incremental in-memory cache of account balance history."""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import valar_api
+from ..utils.keyed_locks import KeyedLocks
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _format_time(value) -> str:
+    return pd.Timestamp(value).strftime(TIME_FORMAT)
+
+
+@dataclass
+class _Series:
+    """Parsed balance samples of one account, sorted by time."""
+
+    start: str
+    times: np.ndarray
+    balances: np.ndarray
+    watermark: str
+    refreshed_at: float = 0.0
+
+    @classmethod
+    def from_frame(cls, start: str, frame: pd.DataFrame) -> "_Series":
+        series = cls(
+            start=start,
+            times=np.empty(0, dtype="datetime64[ns]"),
+            balances=np.empty(0, dtype=np.float64),
+            watermark=start,
+        )
+        series.append(frame)
+        return series
+
+    def append(self, frame: pd.DataFrame) -> None:
+        """
+        Merge samples fetched with ``$gte`` watermark.
+
+        ``updatetime`` has second resolution, so the fetch repeats the samples
+        of the watermark second. The fetched ones replace the held tail from
+        their first time on, and repeated times keep the last sample.
+        """
+        if frame.empty:
+            return
+        frame = frame[~frame.index.duplicated(keep="last")]
+        times = frame.index.values.astype("datetime64[ns]")
+        keep = np.searchsorted(self.times, times[0], side="left")
+        self.times = np.concatenate([self.times[:keep], times])
+        self.balances = np.concatenate([self.balances[:keep], frame["balance"].to_numpy(dtype=np.float64)])
+        self.watermark = _format_time(self.times[-1])
+
+    def prepend(self, start: str, frame: pd.DataFrame) -> None:
+        self.start = start
+        if frame.empty:
+            return
+        self.times = np.concatenate([frame.index.values.astype("datetime64[ns]"), self.times])
+        self.balances = np.concatenate([frame["balance"].to_numpy(dtype=np.float64), self.balances])
+        if self.times.size:
+            self.watermark = max(self.watermark, _format_time(self.times[-1]))
+
+    def evict(self, cutoff: str) -> None:
+        if cutoff <= self.start:
+            return
+        keep = np.searchsorted(self.times, np.datetime64(pd.Timestamp(cutoff)), side="left")
+        self.times = self.times[keep:]
+        self.balances = self.balances[keep:]
+        self.start = cutoff
+
+    def frame(self, accountid: str, start: str) -> pd.DataFrame:
+        first = np.searchsorted(self.times, np.datetime64(pd.Timestamp(start)), side="left")
+        return pd.DataFrame(
+            {"accountid": accountid, "balance": self.balances[first:]},
+            index=pd.DatetimeIndex(self.times[first:], name="updatetime"),
+        )
+
+
+class BalanceHistoryCache:
+    """
+    Per-account balance history kept as NumPy arrays.
+
+    The first read of an account loads its window once. Later reads only fetch
+    samples from the account's high-water mark on, at most once per
+    ``refresh_interval`` seconds. Samples older than ``max_days`` trading days
+    are evicted when the trading day rolls over. Reads lock only the
+    accounts they touch, so a cold load of one account does not hold up
+    reads of the others.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., Awaitable[Any]],
+        max_days: int = 30,
+        refresh_interval: float = 1.0,
+    ):
+        self._fetch = fetch
+        self.max_days = max_days
+        self.refresh_interval = refresh_interval
+        self._series: Dict[str, _Series] = {}
+        self._tradedate: Optional[str] = None
+        self._locks = KeyedLocks()
+
+    async def get(self, account_ids: List[str], days: int) -> Dict[str, pd.DataFrame]:
+        """Return balance frames indexed by updatetime for the last ``days`` trading days."""
+        start = valar_api.account_his_start(days)
+        self._evict()
+        async with self._locks.hold(account_ids):
+            await self._load(account_ids, start)
+            await self._refresh(account_ids)
+            return {
+                account_id: self._series[account_id].frame(account_id, start)
+                for account_id in account_ids
+            }
+
+    def clear(self) -> None:
+        self._series.clear()
+
+    async def _load(self, account_ids: List[str], start: str) -> None:
+        """Load accounts seen for the first time and backfill shorter windows."""
+        missing = [a for a in account_ids if a not in self._series]
+        if missing:
+            data = await self._fetch("get_account_his_range", missing, start)
+            now = time.monotonic()
+            for account_id, frame in valar_api.split_account_his_frame(data, missing).items():
+                series = _Series.from_frame(start, frame)
+                series.refreshed_at = now
+                self._series[account_id] = series
+
+        # Group accounts by their current window start so each gap is one query
+        gaps: Dict[str, List[str]] = {}
+        for account_id in account_ids:
+            series = self._series[account_id]
+            if series.start > start:
+                gaps.setdefault(series.start, []).append(account_id)
+        for end, accounts in gaps.items():
+            data = await self._fetch("get_account_his_range", accounts, start, end)
+            for account_id, frame in valar_api.split_account_his_frame(data, accounts).items():
+                self._series[account_id].prepend(start, frame)
+
+    async def _refresh(self, account_ids: List[str]) -> None:
+        """Fetch samples from each account's high-water mark on."""
+        now = time.monotonic()
+        due = [
+            a for a in account_ids
+            if now - self._series[a].refreshed_at >= self.refresh_interval
+        ]
+        if not due:
+            return
+        data = await self._fetch(
+            "get_account_his_after",
+            {a: self._series[a].watermark for a in due},
+        )
+        for account_id, frame in valar_api.split_account_his_frame(data, due).items():
+            series = self._series[account_id]
+            series.append(frame)
+            series.refreshed_at = now
+
+    def _evict(self) -> None:
+        """Drop samples outside the ``max_days`` window once per trading day."""
+        tradedate = valar_api.normalize_tradedate(None)
+        if tradedate == self._tradedate:
+            return
+        self._tradedate = tradedate
+        cutoff = valar_api.account_his_start(self.max_days)
+        for series in self._series.values():
+            series.evict(cutoff)
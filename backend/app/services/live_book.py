@@ -0,0 +1,309 @@
+"""Live in-memory book of account, position, order and trade documents fed by Mongo change streams."""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from pymongo.errors import OperationFailure, PyMongoError
+
+from . import valar_api
+from .trading_calendar import trading_calendar
+from ..core.mongo import get_async_database
+
+logger = logging.getLogger(__name__)
+
+# Collection -> field identifying a document within its account
+BOOK_KEYS = {
+    "account": "accountid",
+    "position": "local_position_id",
+    "order": "order_id",
+    "trade": "tradeid",
+}
+
+# Fields kept per document: what the valar_api fetchers project, plus keys
+BOOK_FIELDS = {
+    "account": valar_api.ACCOUNT_QUERY.columns,
+    "position": ("accountid", "local_position_id", "volume", "float_pnl"),
+    "order": (*valar_api.ORDER_QUERY.columns, "tradedate"),
+    "trade": (*valar_api.TRADE_QUERY.columns, "tradedate"),
+}
+
+# valar_api fetchers the book answers; the value is the index of their tradedate argument
+BOOK_READS = {
+    "get_accounts": None,
+    "get_orders": 1,
+    "get_orders_multi": 1,
+    "get_special_orders": 1,
+    "get_trades": 1,
+    "get_trades_multi": 1,
+}
+
+# Change stream error code when the resume token has fallen off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+_WATCH_PIPELINE = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+
+
+class _Table:
+    """Documents of one collection keyed by accountid, then by the collection's key field."""
+
+    def __init__(self, key: str, fields: tuple[str, ...]):
+        self.key = key
+        self.fields = fields
+        self.by_account: Dict[str, Dict[Any, dict]] = {}
+        # Mongo _id -> (accountid, key), delete events only carry the _id
+        self.ids: Dict[Any, tuple] = {}
+        # (accountid, key) -> Mongo _id, so a document re-inserted under a new
+        # _id evicts the old one and both maps stay one-to-one
+        self.owners: Dict[tuple, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, doc: dict) -> None:
+        _id = doc.get("_id")
+        location = (doc.get("accountid"), doc.get(self.key))
+        previous = self.ids.get(_id)
+        if previous is not None and previous != location:
+            self._remove(previous)
+        owner = self.owners.get(location)
+        if owner is not None and owner != _id:
+            del self.ids[owner]
+        # Documents are replaced, never modified, so readers can hold references
+        self.by_account.setdefault(location[0], {})[location[1]] = {f: doc[f] for f in self.fields if f in doc}
+        self.ids[_id] = location
+        self.owners[location] = _id
+
+    def delete(self, _id: Any) -> None:
+        location = self.ids.pop(_id, None)
+        if location is not None:
+            self._remove(location)
+
+    def rows(self, account_ids: List[str]) -> List[dict]:
+        return [doc for a in account_ids for doc in self.by_account.get(a, {}).values()]
+
+    def prune(self, field: str, value: Any) -> None:
+        """Drop documents whose ``field`` differs from ``value``."""
+        for _id, (accountid, key) in list(self.ids.items()):
+            if self.by_account[accountid][key].get(field) != value:
+                del self.ids[_id]
+                self._remove((accountid, key))
+
+    def _remove(self, location: tuple) -> None:
+        self.owners.pop(location, None)
+        docs = self.by_account.get(location[0])
+        if docs is not None:
+            docs.pop(location[1], None)
+            if not docs:
+                del self.by_account[location[0]]
+
+
+class LiveBook:
+    """
+    In-memory copy of the live collections maintained from change streams.
+
+    Each collection is loaded once and then follows its change stream, so
+    reads through ValarService cost no Mongo round trip. Orders and trades
+    are kept for the current tradedate only. The resume token of every stream
+    is kept after each batch: a dropped connection resumes the stream where
+    it stopped without reloading, and only a token that has fallen off the
+    oplog triggers a full reload of that collection.
+
+    Change streams need a replica set (a single-node one is enough locally)
+    and the asyncio driver, so VALAR_MONGO_URI must be set.
+    """
+
+    def __init__(self, retry_seconds: float = 1.0, max_await_ms: int = 1000):
+        self.retry_seconds = retry_seconds
+        self.max_await_ms = max_await_ms
+        self.tables = {name: _Table(key, BOOK_FIELDS[name]) for name, key in BOOK_KEYS.items()}
+        self.tradedate: Optional[str] = None
+        self.resume_tokens: Dict[str, Optional[dict]] = {name: None for name in BOOK_KEYS}
+        # Collections loaded and currently following their change stream
+        self._live: set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {"loaded": 0, "changes": 0, "resumes": 0, "reloads": 0, "errors": 0, "last_change": None}
+            for name in BOOK_KEYS
+        }
+
+    @property
+    def ready(self) -> bool:
+        return len(self._live) == len(BOOK_KEYS)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self.tradedate = trading_calendar.tradedate().isoformat()
+        self._tasks = [
+            asyncio.create_task(self._follow(name), name=f"live-book-{name}") for name in BOOK_KEYS
+        ]
+        logger.info("Live book started")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._tasks:
+            logger.info("Live book stopped")
+        self._tasks = []
+        self._live.clear()
+
+    def serves(self, name: str, args: tuple) -> bool:
+        """Whether the valar_api fetcher ``name`` called with ``args`` can be answered from the book."""
+        if not self.ready or name not in BOOK_READS:
+            return False
+        position = BOOK_READS[name]
+        if position is None:
+            return True
+        self._roll()
+        tradedate = args[position] if len(args) > position else None
+        return valar_api.normalize_tradedate(tradedate) == self.tradedate
+
+    def stats(self) -> Dict:
+        return {
+            "running": bool(self._tasks),
+            "ready": self.ready,
+            "tradedate": self.tradedate,
+            "collections": {
+                name: {**self._stats[name], "documents": len(table)} for name, table in self.tables.items()
+            },
+        }
+
+    # valar_api fetchers answered from memory; signatures match valar_api
+
+    def get_accounts(self, accounts: Dict[str, int | float]) -> pd.DataFrame:
+        with self._lock:
+            docs = self.tables["account"].rows(list(accounts))
+            positions = self.tables["position"].rows(list(accounts))
+        # Same as account_summary_pipeline: float_pnl of open positions per account
+        float_pnl: Dict[str, float] = {}
+        for p in positions:
+            if (p.get("volume") or 0) > 0:
+                float_pnl[p["accountid"]] = float_pnl.get(p["accountid"], 0) + (p.get("float_pnl") or 0)
+        docs = [{**doc, "float_pnl": float_pnl.get(doc["accountid"], 0)} for doc in docs]
+        return valar_api.build_accounts_frame(docs, accounts)
+
+    def get_orders(self, accountid: str, tradedate: str | None = None, is_special: bool = False) -> pd.DataFrame | None:
+        return self.get_orders_multi([accountid], tradedate, is_special)
+
+    def get_orders_multi(self, accounts: List[str], tradedate: str | None = None, is_special: bool | None = None, limit: int | None = None) -> pd.DataFrame | None:
+        return self._orders(accounts, is_special, valar_api.ORDER_QUERY, limit)
+
+    def get_special_orders(self, accounts: str | List[str], tradedate: str | None = None, limit: int | None = None) -> pd.DataFrame | None:
+        accounts = [accounts] if isinstance(accounts, str) else accounts
+        return self._orders(accounts, True, valar_api.SPECIAL_ORDER_QUERY, limit)
+
+    def get_trades(self, accountid: str, tradedate: str | None = None) -> pd.DataFrame | None:
+        return self.get_trades_multi([accountid], tradedate)
+
+    def get_trades_multi(self, accounts: List[str], tradedate: str | None = None, limit: int | None = None) -> pd.DataFrame | None:
+        docs = self._today("trade", accounts)
+        return _limit(valar_api.build_trades_frame(docs, valar_api.TRADE_QUERY.sort), limit)
+
+    def _orders(self, accounts: List[str], is_special: bool | None, spec: valar_api.QuerySpec, limit: int | None) -> pd.DataFrame | None:
+        docs = self._today("order", accounts)
+        if is_special is not None:
+            # Same status filter as valar_api.orders_filter
+            if is_special:
+                docs = [d for d in docs if d.get("status") in valar_api.SPECIAL_STATUS]
+            else:
+                docs = [d for d in docs if d.get("status") == "全部成交"]
+        return _limit(valar_api.build_orders_frame(docs, spec.sort), limit)
+
+    def _today(self, name: str, accounts: List[str]) -> List[dict]:
+        with self._lock:
+            docs = self.tables[name].rows(accounts)
+        # Changes of other tradedates are kept until the next roll, but never served
+        return [d for d in docs if d.get("tradedate") == self.tradedate]
+
+    # Ingestion
+
+    async def _follow(self, name: str) -> None:
+        """Load ``name`` and apply its change stream, resuming after errors."""
+        collection = get_async_database()[name]
+        while True:
+            try:
+                token = self.resume_tokens[name]
+                # Open the stream before loading so changes made during the load are replayed
+                stream = await collection.watch(
+                    _WATCH_PIPELINE,
+                    full_document="updateLookup",
+                    resume_after=token,
+                    max_await_time_ms=self.max_await_ms,
+                )
+                async with stream:
+                    if token is None:
+                        await self._load(name, collection)
+                    else:
+                        self._stats[name]["resumes"] += 1
+                        logger.info(f"Live book resumed {name} change stream")
+                    self._live.add(name)
+                    while stream.alive:
+                        change = await stream.try_next()
+                        if change is not None:
+                            self._apply(name, change)
+                        # Also advances while idle, so a resume does not replay old changes
+                        self.resume_tokens[name] = stream.resume_token
+                # The stream was invalidated (collection dropped or renamed) and cannot be resumed
+                self._live.discard(name)
+                self.resume_tokens[name] = None
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self._live.discard(name)
+                self._stats[name]["errors"] += 1
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning(f"Live book {name} resume token expired, reloading")
+                    self._stats[name]["reloads"] += 1
+                    self.resume_tokens[name] = None
+                else:
+                    logger.error(f"Error following {name} change stream: {e}")
+                await asyncio.sleep(self.retry_seconds)
+            except PyMongoError as e:
+                self._live.discard(name)
+                self._stats[name]["errors"] += 1
+                logger.error(f"Error following {name} change stream: {e}")
+                await asyncio.sleep(self.retry_seconds)
+
+    async def _load(self, name: str, collection) -> None:
+        _filter = {"tradedate": self.tradedate} if name in ("order", "trade") else {}
+        projection = {"_id": 1, **{f: 1 for f in BOOK_FIELDS[name]}}
+        docs = await collection.find(_filter, projection).to_list(None)
+        table = _Table(BOOK_KEYS[name], BOOK_FIELDS[name])
+        for doc in docs:
+            table.upsert(doc)
+        with self._lock:
+            self.tables[name] = table
+        self._stats[name]["loaded"] = len(docs)
+        logger.info(f"Live book loaded {len(docs)} {name} documents")
+
+    def _apply(self, name: str, change: dict) -> None:
+        table = self.tables[name]
+        with self._lock:
+            if change["operationType"] == "delete":
+                table.delete(change["documentKey"]["_id"])
+            elif change.get("fullDocument") is not None:
+                table.upsert(change["fullDocument"])
+            else:
+                # Deleted again before the update could be looked up
+                table.delete(change["documentKey"]["_id"])
+        self._stats[name]["changes"] += 1
+        self._stats[name]["last_change"] = time.time()
+
+    def _roll(self) -> None:
+        """Drop orders and trades of the previous tradedate once the tradedate changes."""
+        tradedate = trading_calendar.tradedate().isoformat()
+        if tradedate == self.tradedate:
+            return
+        with self._lock:
+            self.tradedate = tradedate
+            for name in ("order", "trade"):
+                self.tables[name].prune("tradedate", tradedate)
+
+
+def _limit(df: pd.DataFrame | None, limit: int | None) -> pd.DataFrame | None:
+    return df.head(limit) if df is not None and limit else df
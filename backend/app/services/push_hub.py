@@ -0,0 +1,312 @@
+"""Fan-out of live account, position and order updates to WebSocket subscribers."""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from .valar_service import valar_service
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.dependencies import get_user_permissions
+from ..core.executors import auth_executor, realtime_executor
+from ..core.shared_cache import shared_cache
+from ..models.account import AccountConfig
+from ..models.user import User
+from ..utils.json_response import EncodedJSON, dumps, frame_records
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ("accounts", "positions", "orders")
+
+# (topic, accounts, is_special): subscribers with the same key share one read and one encoding
+GroupKey = Tuple[str, Tuple[str, ...], Optional[bool]]
+
+# Invalidation scopes after which permitted accounts of open connections are resolved again
+PERMISSION_SCOPES = ("account_config", "users", "all")
+
+
+class SubscriptionRevoked(Exception):
+    """The connection may no longer receive data: token expired, user deactivated or removed."""
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """One WebSocket connection and the latest unsent payload of each of its topics."""
+
+    websocket: WebSocket
+    user_id: int
+    permitted: Set[str]
+    topics: Dict[str, GroupKey] = field(default_factory=dict)
+    pending: Dict[str, bytes] = field(default_factory=dict)
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+    sent: int = 0
+    coalesced: int = 0
+    replies: int = 0
+    revoked: Optional[str] = None
+
+    def offer(self, topic: str, message: bytes) -> None:
+        """Queue ``message``, replacing an unsent one of the same topic."""
+        if topic in self.pending:
+            self.coalesced += 1
+        self.pending[topic] = message
+        self.wake.set()
+
+    def reply(self, content: dict) -> None:
+        """Queue a control message; it goes through the send loop so sends never overlap."""
+        self.replies += 1
+        self.offer(f"reply:{self.replies}", dumps(content))
+
+    def revoke(self, reason: str) -> None:
+        """Stop sending; the send loop raises SubscriptionRevoked so the connection is closed."""
+        self.revoked = reason
+        self.pending.clear()
+        self.wake.set()
+
+    def take(self) -> Dict[str, bytes]:
+        pending, self.pending = self.pending, {}
+        self.wake.clear()
+        return pending
+
+
+class PushHub:
+    """
+    Pushes account summaries, positions and orders to subscribed clients.
+
+    Every tick (each new snapshot, or ``interval`` seconds) the payload of
+    each distinct (topic, accounts) subscription is read once through
+    ValarService and encoded once, and sent only to subscribers whose data
+    changed. Each subscriber keeps at most one unsent payload per topic, so a
+    slow client gets the latest state instead of a growing queue; a client
+    that cannot take a message within ``send_timeout`` is disconnected.
+
+    Permitted accounts are resolved again whenever accounts, permissions or
+    users change in any worker: subscriptions are narrowed to the accounts
+    still permitted, and connections of inactive or removed users are closed.
+    """
+
+    def __init__(self, service, interval: float = 1.0, send_timeout: float = 10.0):
+        self.service = service
+        self.interval = interval
+        self.send_timeout = send_timeout
+        self.subscribers: Set[Subscriber] = set()
+        self._last: Dict[GroupKey, bytes] = {}
+        self._tick = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._recheck: Optional[asyncio.Task] = None
+        self._recheck_pending = False
+        self._stats = {"ticks": 0, "messages": 0, "disconnected_slow": 0, "revoked": 0, "last_fanout_ms": None}
+        service.snapshots.add_listener(self._tick.set)
+        shared_cache.add_listener(self._on_invalidate)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="push-hub")
+            logger.info("Push hub started")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Push hub stopped")
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            "running": self._task is not None,
+            "subscribers": len(self.subscribers),
+            "groups": len(self._groups()),
+            "coalesced": sum(s.coalesced for s in self.subscribers),
+        }
+
+    def register(self, subscriber: Subscriber) -> None:
+        self.subscribers.add(subscriber)
+
+    def unregister(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+        live = self._groups()
+        for key in [k for k in self._last if k not in live]:
+            del self._last[key]
+
+    def subscribe(self, subscriber: Subscriber, topic: str, accounts: Optional[List[str]], is_special: Optional[bool] = None) -> List[str]:
+        """Subscribe to ``topic`` for the permitted subset of ``accounts``."""
+        targets = [a for a in (accounts or sorted(subscriber.permitted)) if a in subscriber.permitted]
+        subscriber.topics[topic] = (topic, tuple(targets), is_special if topic == "orders" else None)
+        return targets
+
+    async def send_current(self, subscriber: Subscriber, topic: str) -> None:
+        """Queue the current state of a subscribed topic without waiting for the next change."""
+        key = subscriber.topics.get(topic)
+        if key is None or not key[1]:
+            return
+        names, capitals = await realtime_executor.run(_load_account_configs)
+        content, fingerprint = await self._read(key, names, capitals)
+        # A new group starts from this state, so the next tick does not resend it
+        self._last.setdefault(key, fingerprint)
+        if subscriber.topics.get(topic) == key:
+            subscriber.offer(topic, _message(topic, content))
+
+    def unsubscribe(self, subscriber: Subscriber, topic: str) -> None:
+        subscriber.topics.pop(topic, None)
+        subscriber.pending.pop(topic, None)
+
+    async def send_loop(self, subscriber: Subscriber) -> None:
+        """Send queued payloads until the connection closes or stalls."""
+        while True:
+            await subscriber.wake.wait()
+            if subscriber.revoked is not None:
+                self._stats["revoked"] += 1
+                raise SubscriptionRevoked(subscriber.revoked)
+            for message in subscriber.take().values():
+                try:
+                    await asyncio.wait_for(
+                        subscriber.websocket.send_text(message.decode()), timeout=self.send_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self._stats["disconnected_slow"] += 1
+                    logger.warning(f"Disconnecting slow WebSocket client of user {subscriber.user_id}")
+                    raise
+                subscriber.sent += 1
+                self._stats["messages"] += 1
+
+    async def recheck_permissions(self) -> None:
+        """Apply current permissions to every open connection."""
+        subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+        permitted = await auth_executor.run(load_permitted, {s.user_id for s in subscribers})
+        for subscriber in subscribers:
+            allowed = permitted.get(subscriber.user_id)
+            if allowed is None:
+                subscriber.revoke("User is inactive")
+                continue
+            subscriber.permitted = allowed
+            for topic, (_, accounts, is_special) in list(subscriber.topics.items()):
+                targets = tuple(a for a in accounts if a in allowed)
+                if targets == accounts:
+                    continue
+                # Drop queued data of revoked accounts; the narrowed group is sent on the next tick
+                subscriber.pending.pop(topic, None)
+                if targets:
+                    subscriber.topics[topic] = (topic, targets, is_special)
+                    subscriber.reply({"type": "subscribed", "topic": topic, "accounts": list(targets)})
+                else:
+                    self.unsubscribe(subscriber, topic)
+                    subscriber.reply({"type": "unsubscribed", "topic": topic})
+
+    def _on_invalidate(self, scope: str) -> None:
+        if scope not in PERMISSION_SCOPES or not self.subscribers:
+            return
+        # A change arriving during a recheck triggers one more pass, so it is never missed
+        self._recheck_pending = True
+        if self._recheck is None or self._recheck.done():
+            self._recheck = asyncio.create_task(self._run_rechecks(), name="push-permission-recheck")
+
+    async def _run_rechecks(self) -> None:
+        while self._recheck_pending:
+            self._recheck_pending = False
+            try:
+                await self.recheck_permissions()
+            except Exception as e:
+                logger.error(f"Error rechecking stream permissions: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._tick.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._tick.clear()
+            if not self.subscribers:
+                continue
+            started = time.monotonic()
+            try:
+                await self._fanout()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error pushing updates: {e}")
+            self._stats["ticks"] += 1
+            self._stats["last_fanout_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    def _groups(self) -> Dict[GroupKey, List[Subscriber]]:
+        groups: Dict[GroupKey, List[Subscriber]] = {}
+        for subscriber in self.subscribers:
+            for key in subscriber.topics.values():
+                if key[1]:
+                    groups.setdefault(key, []).append(subscriber)
+        return groups
+
+    async def _fanout(self) -> None:
+        groups = self._groups()
+        names, capitals = await realtime_executor.run(_load_account_configs)
+        results = await asyncio.gather(*(self._read(key, names, capitals) for key in groups))
+        for (key, subscribers), (content, fingerprint) in zip(groups.items(), results):
+            if self._last.get(key) == fingerprint:
+                continue
+            self._last[key] = fingerprint
+            message = _message(key[0], content)
+            for subscriber in subscribers:
+                if subscriber.topics.get(key[0]) == key:
+                    subscriber.offer(key[0], message)
+
+    async def _read(self, key: GroupKey, names: Dict[str, str], capitals: Dict[str, float]) -> Tuple[Any, bytes]:
+        """Payload of a subscription group and the bytes that identify its data (without timestamps)."""
+        topic, accounts, is_special = key
+        accounts = list(accounts)
+        if topic == "accounts":
+            initial_capitals = {a: capitals.get(a, 0.0) for a in accounts}
+            frame = await self.service.get_account_summary_frame(accounts, initial_capitals)
+            rows = frame_records(frame)
+            for row in rows:
+                row["account_name"] = names.get(row["account_id"])
+            content = {"summary": self.service.summarize_accounts(frame), "accounts": rows}
+            return content, dumps(rows)
+        if topic == "positions":
+            content = await self.service.get_positions(accounts)
+            return content, dumps(content["positions"])
+        orders, trades = await asyncio.gather(
+            self.service.get_orders_multi(accounts, None, is_special),
+            self.service.get_trades_multi(accounts, None),
+        )
+        content = {"orders": orders, "trades": trades, "accounts": accounts}
+        return content, dumps(content)
+
+
+def _message(topic: str, content: Any) -> bytes:
+    return dumps({"type": "update", "topic": topic, "data": EncodedJSON(dumps(content))})
+
+
+def _load_account_configs() -> Tuple[Dict[str, str], Dict[str, float]]:
+    db = SessionLocal()
+    try:
+        rows = db.query(AccountConfig.account_id, AccountConfig.account_name, AccountConfig.initial_capital).all()
+        return (
+            {account_id: name for account_id, name, _ in rows},
+            {account_id: capital for account_id, _, capital in rows},
+        )
+    finally:
+        db.close()
+
+
+def load_permitted(user_ids) -> Dict[int, Set[str]]:
+    """Permitted accounts of each active user in ``user_ids``; inactive or removed users are left out."""
+    db = SessionLocal()
+    try:
+        users = db.query(User).filter(User.id.in_(list(user_ids))).all()
+        return {user.id: set(get_user_permissions(user, db)) for user in users if user.is_active}
+    finally:
+        db.close()
+
+
+push_hub = PushHub(
+    valar_service,
+    interval=settings.SNAPSHOT_REFRESH_SECONDS,
+    send_timeout=settings.PUSH_SEND_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,406 @@
+"""Background snapshot of live account data shared by all dashboard reads."""
+import asyncio
+import logging
+import secrets
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import valar_api
+from .trading_calendar import trading_calendar
+from ..core.database import SessionLocal
+from ..core.executors import realtime_executor
+from ..models.account import AccountConfig
+
+logger = logging.getLogger(__name__)
+
+
+# Versions carry a random epoch per refresher above the counter bits, so a version
+# issued by another worker or before a restart never matches one of this process.
+# Epoch and counter together stay below 2**53 for JavaScript clients.
+VERSION_COUNTER_BITS = 32
+VERSION_EPOCH_BITS = 20
+
+
+# Row identity of each dataset for delta sync, the first candidate present in the frame is used
+DELTA_KEYS = {
+    "orders": (("accountid", "order_id"),),
+    "trades": (("accountid", "tradeid"),),
+    "positions": (
+        ("accountid", "local_position_id"),
+        ("accountid", "code", "direction"),
+        ("accountid", "symbol", "direction"),
+    ),
+}
+
+
+def _select(df: Optional[pd.DataFrame], account_ids: List[str]) -> Optional[pd.DataFrame]:
+    if df is None or df.empty:
+        return None
+    rows = df[df["accountid"].isin(account_ids)]
+    return rows.reset_index(drop=True) if len(rows) else None
+
+
+def _status_mask(status: pd.Series, is_special: bool | None) -> np.ndarray:
+    """Order status filter of valar_api.orders_filter as a row mask."""
+    if is_special is None:
+        return np.ones(len(status), dtype=bool)
+    if is_special:
+        return status.isin(valar_api.SPECIAL_STATUS).to_numpy()
+    return (status == "全部成交").to_numpy()
+
+
+def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Hash of every row's values, independent of row position and categorical codes."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _account_digests(df: Optional[pd.DataFrame]) -> Dict[str, Tuple[int, int]]:
+    """Row hash sum and row count of each account, independent of row order."""
+    if df is None or df.empty:
+        return {}
+    grouped = pd.Series(_row_hashes(df)).groupby(df["accountid"].to_numpy())
+    sums, sizes = grouped.sum(), grouped.size()
+    return {account: (int(total), int(sizes[account])) for account, total in sums.items()}
+
+
+@dataclass(frozen=True)
+class Signature:
+    """Key columns and row hashes of a dataset, enough to diff a later version against it."""
+
+    key: Tuple[str, ...]
+    rows: pd.DataFrame
+
+    @classmethod
+    def of(cls, dataset: str, df: Optional[pd.DataFrame]) -> Optional["Signature"]:
+        if df is None or df.empty:
+            return None
+        key = next((k for k in DELTA_KEYS[dataset] if set(k) <= set(df.columns)), None)
+        if key is None:
+            return None
+        # Status is kept so the special-order filter can be applied to old versions too
+        rows = df[[*key, *(["status"] if "status" in df.columns and "status" not in key else [])]].copy()
+        rows["_hash"] = _row_hashes(df)
+        return cls(key, rows)
+
+    def select(self, account_ids: List[str], is_special: bool | None = None) -> pd.DataFrame:
+        mask = self.rows["accountid"].isin(account_ids).to_numpy()
+        if "status" in self.rows.columns:
+            mask = mask & _status_mask(self.rows["status"], is_special)
+        return self.rows[mask]
+
+
+@dataclass(frozen=True)
+class Versioned:
+    """What is kept of an older snapshot: its scope and the signature of each dataset."""
+
+    version: int
+    tradedate: str
+    account_ids: FrozenSet[str]
+    signatures: Dict[str, Optional[Signature]]
+
+
+def diff_rows(new: Optional[pd.DataFrame], old_rows: Optional[pd.DataFrame], key: Tuple[str, ...]) -> Dict[str, pd.DataFrame]:
+    """
+    Rows of ``new`` inserted or changed since ``old_rows`` (a Signature selection),
+    and the keys of rows removed since then.
+    """
+    empty_keys = pd.DataFrame(columns=list(key))
+    if new is None or new.empty:
+        removed = old_rows[list(key)] if old_rows is not None else empty_keys
+        return {"inserted": new, "changed": new, "removed": removed.reset_index(drop=True)}
+    if old_rows is None or old_rows.empty:
+        return {"inserted": new, "changed": None, "removed": empty_keys}
+    new_keys = pd.MultiIndex.from_frame(new[list(key)].astype(object))
+    old_keys = pd.MultiIndex.from_frame(old_rows[list(key)].astype(object))
+    existed = new_keys.isin(old_keys)
+    unchanged = np.isin(_row_hashes(new), old_rows["_hash"].to_numpy())
+    return {
+        "inserted": new[~existed].reset_index(drop=True),
+        "changed": new[existed & ~unchanged].reset_index(drop=True),
+        "removed": old_rows.loc[~old_keys.isin(new_keys), list(key)].reset_index(drop=True),
+    }
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Live data of every configured account, fetched in one pass.
+
+    Frames are shared between requests and must be treated as read-only; the
+    slicing methods always return new frames.
+    """
+
+    version: int
+    taken_at: float
+    tradedate: str
+    account_ids: FrozenSet[str]
+    accounts: pd.DataFrame
+    positions: Optional[pd.DataFrame]
+    orders: Optional[pd.DataFrame]
+    trades: Optional[pd.DataFrame]
+    signatures: Dict[str, Optional[Signature]] = field(default_factory=dict)
+    # Dataset -> account -> version in which that account's rows last changed
+    changed: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def covers(self, account_ids: List[str]) -> bool:
+        return self.account_ids.issuperset(account_ids)
+
+    def accounts_frame(self, initial_capitals: Dict[str, float]) -> pd.DataFrame:
+        """Account summary rows for the caller's accounts, ranked in the caller's order."""
+        acc = self.accounts[self.accounts["accountid"].isin(list(initial_capitals))].copy()
+        acc["init_cash"] = acc["accountid"].map(initial_capitals).astype(float)
+        acc["total_pnl"] = acc["balance"] - acc["init_cash"]
+        acc["rank"] = pd.Categorical(acc["accountid"], categories=list(initial_capitals), ordered=True).codes
+        return acc.sort_values("rank", kind="stable")
+
+    def positions_frame(self, account_ids: List[str]) -> Optional[pd.DataFrame]:
+        return _select(self.positions, account_ids)
+
+    def orders_frame(self, account_ids: List[str], is_special: bool | None = None, by_createtime: bool = False) -> Optional[pd.DataFrame]:
+        """Orders of the caller's accounts, filtered by status like valar_api.orders_filter."""
+        orders = _select(self.orders, account_ids)
+        if orders is None:
+            return None
+        if is_special is not None:
+            orders = orders[_status_mask(orders["status"], is_special)]
+            if orders.empty:
+                return None
+        if by_createtime:
+            orders = orders.sort_values("createtime", ascending=False, kind="stable")
+        return orders.reset_index(drop=True)
+
+    def trades_frame(self, account_ids: List[str]) -> Optional[pd.DataFrame]:
+        return _select(self.trades, account_ids)
+
+    def frame(self, dataset: str, account_ids: List[str], is_special: bool | None = None) -> Optional[pd.DataFrame]:
+        if dataset == "orders":
+            return self.orders_frame(account_ids, is_special)
+        if dataset == "trades":
+            return self.trades_frame(account_ids)
+        return self.positions_frame(account_ids)
+
+
+class SnapshotRefresher:
+    """
+    Refreshes a Snapshot of all accounts in AccountConfig on a fixed interval.
+
+    One set of Mongo queries per tick serves every user; ValarService slices
+    the latest snapshot by the caller's accounts. A snapshot older than
+    ``max_age`` seconds is not served and callers query Mongo directly.
+    When one dataset fails to fetch, the tick keeps its previous rows as long
+    as they are younger than ``max_age``, so the other datasets stay fresh.
+    """
+
+    def __init__(self, fetch: Callable[..., Awaitable[Any]], interval: float = 1.0, max_age: float = 5.0, history: int = 60):
+        self._fetch = fetch
+        self.interval = interval
+        self.max_age = max_age
+        self.history = history
+        # Older versions by number, for delta sync
+        self._versions: Dict[int, Versioned] = {}
+        self._digests: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        # When each dataset was last fetched successfully
+        self._fetched_at: Dict[str, float] = {}
+        self.snapshot: Optional[Snapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._epoch = secrets.randbelow(2 ** VERSION_EPOCH_BITS - 1) + 1
+        self._version = self._epoch << VERSION_COUNTER_BITS
+        self._listeners: List[Callable[[], None]] = []
+        self._stats = {"ticks": 0, "errors": 0, "kept_previous": 0, "last_duration_ms": None, "last_error": None}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="snapshot-refresher")
+            logger.info(f"Snapshot refresher started (every {self.interval}s)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Snapshot refresher stopped")
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Call ``listener`` after every published snapshot."""
+        self._listeners.append(listener)
+
+    def current(self, account_ids: List[str], tradedate: str | None = None) -> Optional[Snapshot]:
+        """The latest snapshot if it is fresh, covers ``account_ids`` and is of ``tradedate``."""
+        snapshot = self.snapshot
+        if snapshot is None or time.monotonic() - snapshot.taken_at > self.max_age:
+            return None
+        if tradedate is not None and valar_api.normalize_tradedate(tradedate) != snapshot.tradedate:
+            return None
+        return snapshot if snapshot.covers(account_ids) else None
+
+    def version(self, account_ids: List[str], tradedate: str | None = None) -> Optional[int]:
+        """Version of the snapshot that serves ``account_ids`` now, None if reads go to Mongo."""
+        snapshot = self.current(account_ids, tradedate)
+        return snapshot.version if snapshot is not None else None
+
+    def content_version(self, dataset: str, account_ids: List[str], tradedate: str | None = None) -> Optional[int]:
+        """Version in which the rows of ``dataset`` for ``account_ids`` last changed, None if reads go to Mongo."""
+        snapshot = self.current(account_ids, tradedate)
+        if snapshot is None:
+            return None
+        changed = snapshot.changed.get(dataset, {})
+        return max((changed.get(a, snapshot.version) for a in account_ids), default=snapshot.version)
+
+    def changes(self, dataset: str, account_ids: List[str], since: int, tradedate: str | None = None, is_special: bool | None = None) -> Optional[Dict[str, Any]]:
+        """
+        Rows of ``dataset`` ("orders", "trades" or "positions") changed since version ``since``.
+
+        Returns None when the caller needs a full reload: no fresh snapshot,
+        ``since`` is of another epoch (worker or process start), too old or
+        unknown, or the tradedate or accounts differ.
+        """
+        if since >> VERSION_COUNTER_BITS != self._epoch:
+            return None
+        snapshot = self.current(account_ids, tradedate)
+        old = self._versions.get(since)
+        if snapshot is not None and old is None and since <= snapshot.version:
+            if self.content_version(dataset, account_ids, tradedate) <= since:
+                # Older than the kept history, but nothing of these accounts changed since
+                signature = snapshot.signatures.get(dataset)
+                key = signature.key if signature is not None else DELTA_KEYS[dataset][0]
+                return {"version": snapshot.version, "since": since, "key": list(key), **diff_rows(None, None, key)}
+        if snapshot is None or old is None or old.tradedate != snapshot.tradedate or not old.account_ids.issuperset(account_ids):
+            return None
+        old_signature = old.signatures.get(dataset)
+        new_signature = snapshot.signatures.get(dataset)
+        frame = snapshot.frame(dataset, account_ids, is_special)
+        if frame is not None and new_signature is None:
+            # Rows without a usable key cannot be diffed
+            return None
+        if old_signature is not None and new_signature is not None and old_signature.key != new_signature.key:
+            return None
+        signature = new_signature or old_signature
+        key = signature.key if signature is not None else DELTA_KEYS[dataset][0]
+        old_rows = old_signature.select(account_ids, is_special) if old_signature is not None else None
+        rows = diff_rows(frame, old_rows, key)
+        return {"version": snapshot.version, "since": since, "key": list(key), **rows}
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            **self._stats,
+            "running": self._task is not None,
+            "version": snapshot.version if snapshot else None,
+            "accounts": len(snapshot.account_ids) if snapshot else 0,
+            "age_seconds": round(time.monotonic() - snapshot.taken_at, 3) if snapshot else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                self._stats["last_error"] = str(e)
+                logger.error(f"Error refreshing snapshot: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def refresh(self) -> None:
+        """Fetch all configured accounts once and publish a new snapshot."""
+        started = time.monotonic()
+        initial_capitals = await realtime_executor.run(self._load_accounts)
+        if not initial_capitals:
+            return
+        account_ids = list(initial_capitals)
+        tradedate = trading_calendar.tradedate().isoformat()
+        results = await asyncio.gather(
+            self._fetch("get_accounts", initial_capitals),
+            self._fetch_positions(account_ids),
+            self._fetch("get_orders_multi", account_ids, tradedate, None),
+            self._fetch("get_trades_multi", account_ids, tradedate),
+            return_exceptions=True,
+        )
+        frames = {}
+        for dataset, result in zip(("accounts", "positions", "orders", "trades"), results):
+            if isinstance(result, BaseException):
+                result = self._keep_previous(dataset, result, tradedate, account_ids, started)
+            else:
+                self._fetched_at[dataset] = started
+            frames[dataset] = result
+        accounts, positions, orders, trades = frames["accounts"], frames["positions"], frames["orders"], frames["trades"]
+        self._version += 1
+        signatures = {
+            "positions": Signature.of("positions", positions),
+            "orders": Signature.of("orders", orders),
+            "trades": Signature.of("trades", trades),
+        }
+        previous = self.snapshot.changed if self.snapshot is not None else {}
+        changed: Dict[str, Dict[str, int]] = {}
+        for dataset, frame in (("accounts", accounts), ("positions", positions), ("orders", orders), ("trades", trades)):
+            digests = _account_digests(frame)
+            old_digests, old_changed = self._digests.get(dataset, {}), previous.get(dataset, {})
+            changed[dataset] = {
+                a: old_changed[a] if a in old_changed and old_digests.get(a) == digests.get(a) else self._version
+                for a in account_ids
+            }
+            self._digests[dataset] = digests
+        self.snapshot = Snapshot(
+            version=self._version,
+            taken_at=started,
+            tradedate=tradedate,
+            account_ids=frozenset(account_ids),
+            accounts=accounts,
+            positions=positions,
+            orders=orders,
+            trades=trades,
+            signatures=signatures,
+            changed=changed,
+        )
+        self._versions[self._version] = Versioned(self._version, tradedate, frozenset(account_ids), signatures)
+        self._versions.pop(self._version - self.history, None)
+        self._stats["ticks"] += 1
+        self._stats["last_duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        for listener in self._listeners:
+            listener()
+
+    def _keep_previous(self, dataset: str, error: BaseException, tradedate: str, account_ids: List[str], now: float) -> Optional[pd.DataFrame]:
+        """Previous rows of ``dataset`` after a failed fetch; re-raises ``error`` when they no longer apply."""
+        snapshot = self.snapshot
+        fetched_at = self._fetched_at.get(dataset)
+        if (
+            isinstance(error, asyncio.CancelledError)
+            or snapshot is None
+            or fetched_at is None
+            or now - fetched_at > self.max_age
+            or snapshot.tradedate != tradedate
+            or not snapshot.account_ids.issuperset(account_ids)
+        ):
+            raise error
+        self._stats["kept_previous"] += 1
+        self._stats["last_error"] = str(error)
+        logger.error(f"Error refreshing snapshot {dataset}, keeping the previous rows: {error}")
+        return getattr(snapshot, dataset)
+
+    async def _fetch_positions(self, account_ids: List[str]) -> Optional[pd.DataFrame]:
+        try:
+            positions = await self._fetch("get_positions", account_ids)
+        except KeyError:
+            # Some upstream data sources raise KeyError when no positions exist
+            return None
+        if positions is not None and not positions.empty and "accountid" not in positions.columns:
+            raise ValueError("positions have no accountid column and cannot be sliced per account")
+        return positions
+
+    @staticmethod
+    def _load_accounts() -> Dict[str, float]:
+        db = SessionLocal()
+        try:
+            rows = db.query(AccountConfig.account_id, AccountConfig.initial_capital).all()
+            return {account_id: initial_capital for account_id, initial_capital in rows}
+        finally:
+            db.close()
@@ -0,0 +1,228 @@
+"""Trading calendar and session index, loaded once and answered from arrays."""
+import asyncio
+import datetime as dt
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import valar as va
+
+from ..core.config import settings
+from ..core.executors import history_executor
+
+logger = logging.getLogger(__name__)
+
+# 交易时段(含两端): 夜盘21:00-23:59及00:00-02:30, 上午09:00-11:30, 下午13:00-15:15
+SESSION_WINDOWS = [
+    ("21:00:00", "23:59:59"),
+    ("00:00:00", "02:30:00"),
+    ("09:00:00", "11:30:00"),
+    ("13:00:00", "15:15:00"),
+]
+
+# Session of each window above; the night session spans midnight
+SESSIONS = ("night", "day")
+_WINDOW_SESSION = (0, 0, 1, 1)
+
+# Samples from the start of the evening night window on belong to the next
+# trading day (the window after midnight starts earlier and is left alone)
+NIGHT_ROLL = max(
+    dt.time.fromisoformat(start)
+    for (start, _), session in zip(SESSION_WINDOWS, _WINDOW_SESSION)
+    if SESSIONS[session] == "night"
+)
+
+# The tradedate is assumed to change only at one of these times (valar rolls
+# with the sessions), so it is cached in between. The cache is also capped at
+# TradingCalendar.recheck_seconds, so a roll at any other time is picked up
+# by the next periodic check against va.tradedate_now().
+_ROLL_CHECKS = sorted(
+    {dt.time.fromisoformat(t) for window in SESSION_WINDOWS for t in window} | {NIGHT_ROLL}
+)
+
+
+def _seconds(value: str | dt.time) -> int:
+    t = dt.time.fromisoformat(value) if isinstance(value, str) else value
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def _build_session_index() -> np.ndarray:
+    """Session code (index into SESSIONS, -1 outside sessions) for every second of the day."""
+    index = np.full(86400, -1, dtype=np.int8)
+    for (start, end), session in zip(SESSION_WINDOWS, _WINDOW_SESSION):
+        index[_seconds(start):_seconds(end) + 1] = session
+    return index
+
+
+SESSION_INDEX = _build_session_index()
+_NIGHT_ROLL_SECONDS = _seconds(NIGHT_ROLL)
+
+
+class TradingCalendar:
+    """
+    Trading days and sessions precomputed into NumPy arrays.
+
+    The calendar is loaded once (normally at startup) by walking back from the
+    current tradedate with valar. The current tradedate is cached until the
+    next session boundary, shifts are an index lookup, and mapping timestamps
+    to sessions or tradedates is an array lookup that also works vectorized.
+
+    Reads never load or extend the calendar inline: they serve the last known
+    tradedate and schedule the refresh on the history executor, retrying a
+    failed refresh after ``retry_seconds``.
+    """
+
+    def __init__(self, days: int = 400, recheck_seconds: float = 60.0, retry_seconds: float = 30.0):
+        self.days = days
+        self.recheck_seconds = recheck_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._dates = np.empty(0, dtype="datetime64[D]")
+        self._position: dict[dt.date, int] = {}
+        # Dense map: calendar day offset from the first tradedate -> tradedate index
+        self._next_index = np.empty(0, dtype=np.int32)
+        self._tradedate: Optional[dt.date] = None
+        self._valid_until: Optional[dt.datetime] = None
+        self._refreshing = False
+        self._retry_at = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Future] = None
+
+    @property
+    def loaded(self) -> bool:
+        return len(self._dates) > 0
+
+    async def start(self) -> None:
+        """Load the calendar on the history executor; later refreshes are scheduled on this loop."""
+        self._loop = asyncio.get_running_loop()
+        self._refreshing = True
+        await self._run(self.load)
+
+    def load(self) -> None:
+        """Load ``days`` trading days back from the current tradedate."""
+        with self._lock:
+            current = va.tradedate_now()
+            dates = [current]
+            for _ in range(self.days):
+                dates.append(va.get_shifted_tradedate(dates[-1], 1))
+            self._set_dates(dates[::-1])
+            self._set_tradedate(current, dt.datetime.now())
+        logger.info(f"Trading calendar loaded: {dates[-1]} ~ {current}")
+
+    def tradedate(self, now: Optional[dt.datetime] = None) -> dt.date:
+        """Current tradedate; after a session boundary the last known one until the refresh lands."""
+        now = now or dt.datetime.now()
+        if self._valid_until is not None and now < self._valid_until:
+            return self._tradedate
+        self._schedule(self._refresh if self.loaded else self.load)
+        if self._tradedate is None:
+            # Nothing known yet (startup load failed): ask valar once and keep
+            # it, without hammering valar while the refresh is backing off
+            with self._lock:
+                if self._tradedate is None:
+                    if time.monotonic() < self._retry_at:
+                        raise RuntimeError("Trading calendar is unavailable")
+                    try:
+                        self._tradedate = va.tradedate_now()
+                    except Exception:
+                        self._retry_at = time.monotonic() + self.retry_seconds
+                        raise
+        return self._tradedate
+
+    def shift(self, date: dt.date, n: int) -> dt.date:
+        """The tradedate ``n`` trading days before ``date`` (after, if negative)."""
+        if not self.loaded:
+            self._schedule(self.load)
+        i = self._position.get(date)
+        if i is not None and 0 <= i - n < len(self._dates):
+            return self._dates[i - n].item()
+        # Outside the preloaded range
+        return va.get_shifted_tradedate(date, n)
+
+    def session_of(self, timestamp: dt.datetime) -> Optional[str]:
+        """Name of the session ``timestamp`` falls in, None outside trading hours."""
+        code = SESSION_INDEX[_seconds(timestamp.time())]
+        return SESSIONS[code] if code >= 0 else None
+
+    def session_codes(self, times: np.ndarray) -> np.ndarray:
+        """Vectorized session lookup: index into SESSIONS, -1 outside sessions."""
+        times = np.asarray(times, dtype="datetime64[s]")
+        seconds = (times - times.astype("datetime64[D]")).astype(np.int64)
+        return SESSION_INDEX[seconds]
+
+    def tradedates_of(self, times: np.ndarray) -> np.ndarray:
+        """Vectorized tradedate of each timestamp; night samples belong to the next tradedate."""
+        if not self.loaded:
+            self._schedule(self.load)
+            raise RuntimeError("Trading calendar is not loaded yet")
+        times = np.asarray(times, dtype="datetime64[s]")
+        days = times.astype("datetime64[D]")
+        seconds = (times - days).astype(np.int64)
+        days = days + (seconds >= _NIGHT_ROLL_SECONDS)
+        offset = (days - self._dates[0]).astype(np.int64)
+        offset = np.clip(offset, 0, len(self._next_index) - 1)
+        return self._dates[self._next_index[offset]]
+
+    def _refresh(self) -> None:
+        """Pick up a tradedate roll, and the tradedates it adds, after a session boundary."""
+        current = va.tradedate_now()
+        with self._lock:
+            self._extend(current)
+            self._set_tradedate(current, dt.datetime.now())
+
+    def _schedule(self, refresh: Callable[[], None]) -> None:
+        """Run ``refresh`` on the history executor unless one is running or backing off."""
+        if self._refreshing or time.monotonic() < self._retry_at:
+            return
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from an executor thread: hand the refresh to the app's loop
+            if self._loop is None or self._loop.is_closed():
+                return
+        self._refreshing = True
+        self._task = asyncio.run_coroutine_threadsafe(self._run(refresh), self._loop)
+
+    async def _run(self, refresh: Callable[[], None]) -> None:
+        try:
+            await history_executor.run(refresh)
+            self._retry_at = 0.0
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.retry_seconds
+            logger.warning(f"Trading calendar refresh failed, retrying in {self.retry_seconds:.0f}s: {e}")
+        finally:
+            self._refreshing = False
+
+    def _set_dates(self, dates: list[dt.date]) -> None:
+        self._dates = np.array(dates, dtype="datetime64[D]")
+        self._position = {d: i for i, d in enumerate(dates)}
+        offsets = (self._dates - self._dates[0]).astype(np.int64)
+        # For each calendar day, the first tradedate on or after it
+        self._next_index = np.searchsorted(offsets, np.arange(offsets[-1] + 1)).astype(np.int32)
+
+    def _extend(self, current: dt.date) -> None:
+        """Append tradedates up to ``current`` once the trading day rolls over."""
+        last = self._dates[-1].item()
+        if current <= last:
+            return
+        new = [current]
+        while True:
+            previous = va.get_shifted_tradedate(new[-1], 1)
+            if previous <= last:
+                break
+            new.append(previous)
+        self._set_dates([d.item() for d in self._dates] + new[::-1])
+
+    def _set_tradedate(self, current: dt.date, now: dt.datetime) -> None:
+        self._tradedate = current
+        later = [t for t in _ROLL_CHECKS if t > now.time()]
+        if later:
+            boundary = dt.datetime.combine(now.date(), later[0])
+        else:
+            boundary = dt.datetime.combine(now.date() + dt.timedelta(days=1), _ROLL_CHECKS[0])
+        self._valid_until = min(boundary, now + dt.timedelta(seconds=self.recheck_seconds))
+
+
+trading_calendar = TradingCalendar(days=settings.TRADING_CALENDAR_DAYS)
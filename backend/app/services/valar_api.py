@@ -1,25 +1,423 @@
-from typing import Dict
-import pymongo
+from typing import Callable, Dict
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, replace
+from pymongo.database import Database
 import datetime as dt
-import os
+import logging
+import numpy as np
 import valar as va
 from valar.dependencies import pandas as pd
 from valar.dependencies import polars as pl
 
+try:
+    # 可选依赖: 安装pymongoarrow后查询结果直接从BSON批次解码为Arrow列
+    import pyarrow as pa
+    from pymongoarrow.api import Schema, aggregate_arrow_all, find_arrow_all
+except ImportError:
+    pa = None
+from ..core.config import settings
+from ..core.executors import process_offload
+from ..core.mongo import get_database
+from .trading_calendar import SESSION_WINDOWS, trading_calendar
 
-def get_mongo_client() -> pymongo.MongoClient:
+logger = logging.getLogger(__name__)
+
+
+def get_mongo_client() -> Database:
     """
-    获取MongoDB客户端.
+    获取MongoDB数据库句柄, 进程内共享同一个连接池.
     """
-    connection_name = os.getenv("VALAR_MONGO_CONNECTION", "VALAR")
-    return va.get_mongo_client(connection_name)
+    return get_database()
 
 def get_positions(accounts: str | list[str]) -> pd.DataFrame:
     """
     获取账户的持仓信息.
+
+    get_realtime_pos只接受连接配置名, 持仓聚合(agg)在valar内部完成, 无法传入共享连接池;
+    使用与连接池相同的配置(settings.VALAR_MONGO_CONNECTION), 与其他查询读取同一数据源.
+    """
+    return va.get_realtime_pos(accounts=accounts, agg=True, profile=settings.VALAR_MONGO_CONNECTION)
+
+SPECIAL_STATUS = ["提交中","未成交","部分成交","已撤销","拒单"]
+HEADERS_ORDER = ["accountid","code","exchange","direction","offset","price","volume","order_id","type","traded","status","createtime","updatetime"]
+HEADERS_TRADE = ["accountid","code","exchange","direction","offset","price","volume","order_id","tradeid","createtime"]
+
+# 订单/成交表的紧凑schema, 入库时统一转换一次:
+# 低基数字段字典编码(分类), 整数字段降为int32.
+# 价格保持float64, 降精度会改变返回的数值; 时间保持原始字符串, 原样返回.
+CATEGORY_COLUMNS = ("accountid","code","exchange","direction","offset","type","status")
+INT32_COLUMNS = ("volume","traded")
+
+# 各集合字段类型(见mongo_data_structure.md), 用于Arrow解码的schema
+COLLECTION_SCHEMAS = {
+    "order": {
+        "accountid": "string", "order_id": "string", "createtime": "string", "direction": "string",
+        "exchange": "string", "offset": "string", "price": "double", "status": "string",
+        "symbol": "string", "traded": "int", "tradedate": "string", "type": "string",
+        "updatetime": "string", "volume": "int",
+    },
+    "trade": {
+        "accountid": "string", "tradeid": "string", "tradedate": "string", "createtime": "string",
+        "direction": "string", "exchange": "string", "offset": "string", "order_id": "string",
+        "price": "double", "symbol": "string", "volume": "int",
+    },
+    "account": {
+        "accountid": "string", "available": "double", "balance": "double", "frozen": "double",
+        "margin": "double", "updatetime": "string",
+    },
+    "account_his": {
+        "accountid": "string", "updatetime": "string", "available": "double", "balance": "double",
+        "frozen": "double", "margin": "double",
+    },
+}
+_ARROW_TYPES = {"string": "string", "double": "float64", "int": "int64", "bool": "bool_"}
+_POLARS_TYPES = {"string": pl.String, "double": pl.Float64, "int": pl.Int64, "bool": pl.Boolean}
+
+
+def arrow_enabled() -> bool:
+    """是否使用Arrow列式解码(需安装pymongoarrow, 且未在配置中关闭)."""
+    return pa is not None and settings.VALAR_ARROW_DECODE
+
+
+def arrow_schema(collection: str, columns, extra: dict | None = None) -> "Schema":
+    """按集合的字段类型生成pymongoarrow的Schema, 只包含columns中的字段; extra补充计算字段的类型."""
+    types = {**COLLECTION_SCHEMAS[collection], **(extra or {})}
+    return Schema({col: getattr(pa, _ARROW_TYPES[types[col]])() for col in columns})
+
+
+def to_polars(data: "list[dict] | pa.Table") -> pl.DataFrame:
+    """文档列表或Arrow表转换为polars DataFrame, Arrow表不复制数据."""
+    if isinstance(data, list):
+        # 按全部文档推断类型, 避免同一字段中整数和浮点混用时出错
+        return pl.DataFrame(data, infer_schema_length=None)
+    return pl.from_arrow(data)
+
+
+def _arrow_ipc(table: "pa.Table") -> bytes:
+    """Arrow表写为IPC流, 只复制列缓冲区, 不做类型转换."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _run_stage_ipc(stage: Callable[..., pl.DataFrame], data: bytes, *args) -> bytes:
+    """在子进程中执行转换: 输入和结果都是Arrow IPC流."""
+    return stage(pl.read_ipc_stream(data), *args).write_ipc_stream(None).getvalue()
+
+
+def transform(stage: Callable[..., pl.DataFrame], docs: "list[dict] | pa.Table", *args) -> pl.DataFrame:
+    """
+    执行polars转换stage(df, *args).
+
+    行数达到阈值的Arrow表以IPC缓冲区交给进程池转换, 转换期间不占用本进程的GIL;
+    文档列表(异步后端和实时簿)构建DataFrame本身就需要GIL, 仍在当前线程转换.
+    """
+    if not isinstance(docs, list) and process_offload.accepts(len(docs)):
+        try:
+            result = process_offload.call(len(docs), _run_stage_ipc, stage, _arrow_ipc(docs), *args)
+            return pl.read_ipc_stream(result)
+        except BrokenProcessPool as e:
+            logger.error(f"Process pool failed, transforming in thread: {e}")
+    return stage(to_polars(docs), *args)
+
+
+# Map Chinese direction to English for frontend compatibility
+DIRECTION_MAP = {
+    "多": "long",
+    "空": "short",
+    "long": "long",
+    "short": "short",
+    "买": "long",
+    "卖": "short"
+}
+
+
+@dataclass(frozen=True)
+class QuerySpec:
+    """
+    数据集的Mongo查询规格: 集合, 需要的字段, 默认排序和条数限制.
+
+    字段投影、排序和limit都下推到Mongo, 只传输需要的字段.
+    """
+    collection: str
+    columns: tuple[str, ...]
+    sort: tuple[tuple[str, int], ...] = ()
+    limit: int = 0
+    batch_size: int = 1000
+
+    @property
+    def projection(self) -> dict:
+        return {"_id": 0, **{col: 1 for col in self.columns}}
+
+    def find(self, db, _filter: dict, limit: int | None = None):
+        """返回游标, 同时适用于同步和asyncio驱动的数据库句柄."""
+        return db[self.collection].find(
+            _filter,
+            self.projection,
+            sort=list(self.sort) or None,
+            limit=self.limit if limit is None else limit,
+            batch_size=self.batch_size,
+        )
+
+    def fetch(self, db, _filter: dict, limit: int | None = None) -> "list[dict] | pa.Table":
+        """
+        同步查询全部结果.
+
+        启用Arrow解码时BSON批次直接写入Arrow列, 不为每个文档创建dict;
+        否则返回文档列表.
+        """
+        if not arrow_enabled():
+            return list(self.find(db, _filter, limit))
+        return find_arrow_all(
+            db[self.collection],
+            _filter,
+            schema=arrow_schema(self.collection, self.columns),
+            sort=list(self.sort) or None,
+            limit=self.limit if limit is None else limit,
+            batch_size=self.batch_size,
+        )
+
+
+ORDER_QUERY = QuerySpec(
+    "order",
+    ("accountid","symbol","exchange","direction","offset","price","volume","order_id","type","traded","status","createtime","updatetime"),
+    sort=(("updatetime", -1),),
+)
+SPECIAL_ORDER_QUERY = replace(ORDER_QUERY, sort=(("createtime", -1),))
+TRADE_QUERY = QuerySpec(
+    "trade",
+    ("accountid","symbol","exchange","direction","offset","price","volume","order_id","tradeid","createtime"),
+    sort=(("createtime", -1),),
+)
+ACCOUNT_QUERY = QuerySpec("account", ("accountid","balance","margin","available","frozen","updatetime"))
+
+
+def account_summary_schema() -> "Schema":
+    """account_summary_pipeline输出的Arrow schema: 账户字段加持仓浮动盈亏."""
+    return arrow_schema("account", (*ACCOUNT_QUERY.columns, "float_pnl"), {"float_pnl": "double"})
+ACCOUNT_HIS_QUERY = QuerySpec(
+    "account_his",
+    ("accountid","updatetime","balance"),
+    sort=(("accountid", 1), ("updatetime", 1)),
+    batch_size=5000,
+)
+
+
+def normalize_tradedate(tradedate: str | dt.date | None) -> str:
+    """把交易日统一转换为ISO字符串, 默认当天."""
+    if tradedate is None:
+        return trading_calendar.tradedate().isoformat()
+    elif isinstance(tradedate, dt.date):
+        return tradedate.isoformat()
+    return tradedate  # Assume it's already a string
+
+
+def orders_filter(accounts: str | list[str], tradedate: str | dt.date | None = None, is_special: bool | None = None) -> dict:
+    """构造订单查询条件. is_special为None时不按状态过滤."""
+    _filter = {"tradedate": normalize_tradedate(tradedate)}
+    _filter["accountid"] = accounts if isinstance(accounts, str) else {"$in": accounts}
+    if is_special is not None:
+        _filter["status"] = {"$in": SPECIAL_STATUS} if is_special else "全部成交"
+    return _filter
+
+
+def trades_filter(accounts: str | list[str], tradedate: str | dt.date | None = None) -> dict:
+    """构造成交查询条件."""
+    return {
+        "accountid": accounts if isinstance(accounts, str) else {"$in": accounts},
+        "tradedate": normalize_tradedate(tradedate),
+    }
+
+
+def session_time_expr(field: str = "$updatetime") -> dict:
+    """
+    交易时段过滤的Mongo表达式, 比较"YYYY-MM-DD HH:MM:SS"中的时间部分.
+
+    与SESSION_WINDOWS一致, 非交易时段的样本不会被传输和解析.
+    """
+    time_part = {"$substrBytes": [field, 11, 8]}
+    return {"$or": [
+        {"$and": [{"$gte": [time_part, start]}, {"$lte": [time_part, end]}]}
+        for start, end in SESSION_WINDOWS
+    ]}
+
+
+def account_his_start(days: int = 5, start_date: dt.date | None = None) -> str:
+    """资金历史的起始时间: 起始交易日前一日收盘(15:15)."""
+    if start_date is None:
+        start_date = trading_calendar.shift(trading_calendar.tradedate(), days)
+    return dt.datetime.combine(start_date, dt.time(15,15,0)).isoformat(sep=" ")
+
+
+def account_his_filter(accounts: str | list[str], days: int = 5, start_date: dt.date | None = None) -> dict:
+    """构造资金历史查询条件, 只保留交易时段内的样本."""
+    return account_his_range_filter(accounts, account_his_start(days, start_date))
+
+
+def account_his_range_filter(accounts: str | list[str], start: str, end: str | None = None) -> dict:
+    """构造[start, end)区间的资金历史查询条件."""
+    updatetime = {"$gte": start}
+    if end is not None:
+        updatetime["$lt"] = end
+    return {
+        "accountid": accounts if isinstance(accounts, str) else {"$in": accounts},
+        "updatetime": updatetime,
+        "$expr": session_time_expr(),
+    }
+
+
+def account_his_after_filter(watermarks: Dict[str, str]) -> dict:
     """
-    connection_name = os.getenv("VALAR_MONGO_CONNECTION", "VALAR")
-    return va.get_realtime_pos(accounts=accounts, agg=True, profile=connection_name)
+    构造增量查询条件: 每个账户取updatetime不早于其高水位的样本.
+
+    updatetime只精确到秒, 用$gte才不会漏掉与高水位同一秒内后写入的样本;
+    高水位那一秒的样本会重复返回, 调用方按(accountid, updatetime)去重.
+    """
+    return {
+        "$or": [
+            {"accountid": accountid, "updatetime": {"$gte": watermark}}
+            for accountid, watermark in watermarks.items()
+        ],
+        "$expr": session_time_expr(),
+    }
+
+
+def account_summary_pipeline(accountids: list[str]) -> list[dict]:
+    """
+    账户汇总的聚合管道: 每个账户一行, 浮动盈亏在Mongo端按持仓(volume>0)求和.
+
+    只有汇总后的账户行会返回, 持仓明细不出数据库. 没有持仓的账户float_pnl为0.
+    """
+    return [
+        {"$match": {"accountid": {"$in": accountids}}},
+        {"$lookup": {
+            "from": "position",
+            "localField": "accountid",
+            "foreignField": "accountid",
+            "as": "pos",
+        }},
+        {"$unwind": {"path": "$pos", "preserveNullAndEmptyArrays": True}},
+        {"$group": {
+            "_id": "$accountid",
+            **{col: {"$first": f"${col}"} for col in ACCOUNT_QUERY.columns},
+            "float_pnl": {"$sum": {"$cond": [{"$gt": ["$pos.volume", 0]}, "$pos.float_pnl", 0]}},
+        }},
+        {"$project": {"_id": 0}},
+    ]
+
+
+def _reindex(lf: pl.LazyFrame, columns: list[str], collection: str) -> pl.LazyFrame:
+    """
+    按columns选列, 缺失的列补空值(同pandas的reindex).
+
+    缺失的列和全为空值的列(文档列表中推断为Null类型)按集合的字段类型转换, 后续表达式不会因Null类型失败.
+    """
+    types = {**COLLECTION_SCHEMAS[collection], "code": COLLECTION_SCHEMAS[collection]["symbol"]}
+    present = lf.collect_schema()
+    selected = []
+    for c in columns:
+        dtype = _POLARS_TYPES[types[c]] if c in types else None
+        if c not in present:
+            selected.append(pl.lit(None, dtype=dtype or pl.Null).alias(c))
+        elif dtype is not None and present[c] == pl.Null:
+            selected.append(pl.col(c).cast(dtype))
+        else:
+            selected.append(pl.col(c))
+    return lf.select(selected)
+
+
+def _sort(lf: pl.LazyFrame, sort: tuple[tuple[str, int], ...]) -> pl.LazyFrame:
+    """按QuerySpec的排序规格排序, 稳定排序并保持空值在后."""
+    if not sort:
+        return lf
+    return lf.sort(
+        [col for col, _ in sort],
+        descending=[direction < 0 for col, direction in sort],
+        nulls_last=True,
+        maintain_order=True,
+    )
+
+
+def _compact(lf: pl.LazyFrame, columns: list[str]) -> pl.LazyFrame:
+    """按紧凑schema转换列类型."""
+    return lf.with_columns(
+        *[pl.col(c).cast(pl.String).cast(pl.Categorical) for c in CATEGORY_COLUMNS if c in columns],
+        *[pl.col(c).cast(pl.Int32) for c in INT32_COLUMNS if c in columns],
+    )
+
+
+def _format_percent(ratio: pl.Series) -> pl.Series:
+    return pl.Series(np.char.mod("%.2f%%", ratio.to_numpy() * 100))
+
+
+def build_accounts_frame(docs: "list[dict] | pa.Table", accounts: Dict[str, int | float]) -> pd.DataFrame:
+    """由account_summary_pipeline的结果(文档列表或Arrow表)生成账户汇总表."""
+    # 初始资金和排名来自账户字典, 与结果连接后按排名排序, 整体为一个惰性查询计划
+    ranks = pl.LazyFrame({
+        "accountid": list(accounts),
+        "init_cash": pl.Series(list(accounts.values()), dtype=pl.Float64),
+        "rank": pl.int_range(len(accounts), eager=True),
+    })
+    return to_polars(docs).lazy().join(ranks, on="accountid", how="left").with_columns(
+        pl.col("float_pnl").cast(pl.Int64),
+        (pl.col("margin") / pl.col("balance")).map_batches(_format_percent, return_dtype=pl.String).alias("margin%"),
+        (pl.col("balance") - pl.col("init_cash")).alias("total_pnl"),
+    ).sort("rank").select(
+        ["accountid","balance","float_pnl","total_pnl","margin","margin%","available","init_cash","frozen","updatetime","rank"]
+    ).collect().to_pandas()
+
+
+def _order_like_stage(df: pl.DataFrame, collection: str, headers: list[str], sort: tuple[tuple[str, int], ...]) -> pl.DataFrame:
+    lf = df.lazy().rename({"symbol": "code"}, strict=False)
+    lf = _reindex(lf, headers, collection).with_columns(
+        pl.col("direction").cast(pl.String).replace(DIRECTION_MAP)
+    )
+    # 时间字符串为零填充的固定格式, 按字符串排序即按时间排序, 与Mongo端排序一致
+    return _sort(_compact(lf, headers), sort).collect()
+
+
+def _build_order_like_frame(docs: "list[dict] | pa.Table", collection: str, headers: list[str], sort: tuple[tuple[str, int], ...]) -> pd.DataFrame | None:
+    if not len(docs):
+        return None
+    return transform(_order_like_stage, docs, collection, headers, sort).to_pandas()
+
+
+def build_orders_frame(docs: "list[dict] | pa.Table", sort: tuple[tuple[str, int], ...] = ()) -> pd.DataFrame | None:
+    """由order文档或Arrow表(已按ORDER_QUERY投影)生成紧凑schema的订单表, 按sort排序, 无数据时返回None."""
+    return _build_order_like_frame(docs, "order", HEADERS_ORDER, sort)
+
+
+def build_trades_frame(docs: "list[dict] | pa.Table", sort: tuple[tuple[str, int], ...] = ()) -> pd.DataFrame | None:
+    """由trade文档或Arrow表(已按TRADE_QUERY投影)生成紧凑schema的成交表, 按sort排序, 无数据时返回None."""
+    return _build_order_like_frame(docs, "trade", HEADERS_TRADE, sort)
+
+
+def _account_his_stage(df: pl.DataFrame) -> pl.DataFrame:
+    return df.lazy().select(
+        "accountid",
+        pl.col("updatetime").str.strptime(pl.Datetime, format="%Y-%m-%d %H:%M:%S"),
+        "balance",
+    ).collect()
+
+
+def build_account_his_frame(docs: "list[dict] | pa.Table") -> pd.DataFrame:
+    """由account_his文档或Arrow表(已在Mongo端按交易时段过滤)生成资金曲线."""
+    # 如果没有数据，返回空的DataFrame
+    if not len(docs):
+        return pd.DataFrame(columns=["accountid", "balance"]).set_index(pd.DatetimeIndex([], name="updatetime"))
+
+    data = transform(_account_his_stage, docs).to_pandas().set_index("updatetime")
+
+    return data
+
+
+def split_account_his_frame(data: pd.DataFrame, accounts: list[str]) -> Dict[str, pd.DataFrame]:
+    """按账户拆分资金曲线, 没有数据的账户得到空表."""
+    groups = dict(tuple(data.groupby("accountid", sort=False))) if len(data) else {}
+    empty = data.iloc[0:0]
+    return {accountid: groups.get(accountid, empty) for accountid in accounts}
+
 
 def get_accounts(accounts: Dict[str, int | float]) -> pd.DataFrame:
     """
@@ -31,68 +429,21 @@ def get_accounts(accounts: Dict[str, int | float]) -> pd.DataFrame:
         账户字典,键为账户ID,值为初始资金.
     """
     client = get_mongo_client()
-    cursor_acc = client["account"].find({"accountid":{"$in":list(accounts.keys())}}) 
-    acc = pd.DataFrame([item for item in cursor_acc])
-
-    cursor_pos = client["position"].find({"accountid":{"$in":list(accounts.keys())},"volume":{"$gt":0}}) #取pos vol>0
-    pos = pd.DataFrame([item for item in cursor_pos])
-
-    # Handle accounts with no positions
-    if len(pos) > 0:
-        # Use groupby().sum() instead of apply() to avoid FutureWarning
-        float_pnl = pos.groupby("accountid", as_index=False)["float_pnl"].sum()
-        float_pnl["float_pnl"] = float_pnl["float_pnl"].astype(int)
-        float_pnl = dict(zip(float_pnl["accountid"], float_pnl["float_pnl"]))
-    else:
-        float_pnl = {}
-
-    # Use .get() to handle accounts without positions (default to 0)
-    acc["float_pnl"] = acc["accountid"].apply(lambda x: float_pnl.get(x, 0))
-    acc["margin%"] = (acc["margin"]/acc["balance"]).apply(lambda x: format(x, ".2%"))
-    acc["init_cash"] = acc["accountid"].apply(lambda x: accounts[x])
-    acc["total_pnl"] = acc["balance"] - acc["init_cash"]
-    acc = acc.loc[:,["accountid","balance","float_pnl","total_pnl","margin","margin%","available","init_cash","frozen","updatetime"]]
-    acc["rank"] = acc["accountid"].apply(list(accounts.keys()).index)
-    return acc.sort_values("rank")
-
-def get_special_orders(accounts: str | list[str], tradedate: str | dt.date | None = None) -> pd.DataFrame | None:
-    """返回多个账户的特殊状态的订单("提交中","未成交","部分成交","已撤销","拒单")."""
-    if tradedate is None:
-        tradedate = va.tradedate_now().isoformat()
-    elif isinstance(tradedate, dt.date):
-        tradedate = tradedate.isoformat()
+    pipeline = account_summary_pipeline(list(accounts.keys()))
+    if arrow_enabled():
+        docs = aggregate_arrow_all(client["account"], pipeline, schema=account_summary_schema())
     else:
-        pass # Assume it's already a string
+        docs = list(client["account"].aggregate(pipeline))
+    return build_accounts_frame(docs, accounts)
 
+def get_special_orders(accounts: str | list[str], tradedate: str | dt.date | None = None, limit: int | None = None) -> pd.DataFrame | None:
+    """返回多个账户的特殊状态的订单("提交中","未成交","部分成交","已撤销","拒单")."""
     accounts = [accounts] if isinstance(accounts, str) else accounts
     client = get_mongo_client()
 
     #提取特殊状态订单
-    cursor = client["order"].find({
-        "accountid":{"$in":accounts},
-        "status":{"$in":["提交中","未成交","部分成交","已撤销","拒单"]},
-        "tradedate":tradedate})
-    order = pd.DataFrame([item for item in cursor])
-    if len(order):
-        order["code"] = order["symbol"]
-        order.sort_values(by=["createtime"], ascending=False, inplace=True)
-        headers_order = ["accountid","code","exchange","direction","offset","price","volume","order_id","type","traded","status","createtime","updatetime"]
-        order = order[headers_order]
-
-        # Map Chinese direction to English for frontend compatibility
-        direction_map = {
-            "多": "long",
-            "空": "short",
-            "long": "long",
-            "short": "short",
-            "买": "long",
-            "卖": "short"
-        }
-        order['direction'] = order['direction'].map(direction_map).fillna(order['direction'])
-
-        return order
-    else:
-        return None
+    docs = SPECIAL_ORDER_QUERY.fetch(client, orders_filter(accounts, tradedate, is_special=True), limit)
+    return build_orders_frame(docs, SPECIAL_ORDER_QUERY.sort)
 
 def get_orders(accountid: str, tradedate: str | dt.date | None = None, is_special: bool = False) -> pd.DataFrame | None:
     """
@@ -108,42 +459,9 @@ def get_orders(accountid: str, tradedate: str | dt.date | None = None, is_specia
         True  -> 只返回特殊状态的订单("提交中","未成交","部分成交","已撤销","拒单").
         False -> 返回所有"全部成交"状态的订单.
     """
-    if tradedate is None:
-        tradedate = va.tradedate_now().isoformat()
-    elif isinstance(tradedate, dt.date):
-        tradedate = tradedate.isoformat()
-    else:
-        pass # Assume it's already a string
-
     client = get_mongo_client()
-    if is_special:
-        status = {"$in":["提交中","未成交","部分成交","已撤销","拒单"]}
-    else:
-        status = "全部成交"
-    
-    cursor = client["order"].find({"accountid":accountid,"status":status,"tradedate":tradedate})
-    order_ctp = pd.DataFrame([item for item in cursor])
-    
-    if len(order_ctp):
-        order_ctp = order_ctp.sort_values(by=["updatetime"], ascending=False)
-        headers_order = ["accountid","code","exchange","direction","offset","price","volume","order_id","type","traded","status","createtime","updatetime"]
-        order_ctp["code"] = order_ctp["symbol"]
-        order_ctp = order_ctp[headers_order]
-
-        # Map Chinese direction to English for frontend compatibility
-        direction_map = {
-            "多": "long",
-            "空": "short",
-            "long": "long",
-            "short": "short",
-            "买": "long",
-            "卖": "short"
-        }
-        order_ctp['direction'] = order_ctp['direction'].map(direction_map).fillna(order_ctp['direction'])
-
-        return order_ctp
-    else:
-        return None
+    docs = ORDER_QUERY.fetch(client, orders_filter(accountid, tradedate, is_special))
+    return build_orders_frame(docs, ORDER_QUERY.sort)
 
 def get_trades(accountid: str, tradedate: str | dt.date | None = None) -> pd.DataFrame | None:
     """
@@ -156,36 +474,9 @@ def get_trades(accountid: str, tradedate: str | dt.date | None = None) -> pd.Dat
     tradedate
         交易日期. 如果为None, 默认使用今日.
     """
-    if tradedate is None:
-        tradedate = va.tradedate_now().isoformat()
-    elif isinstance(tradedate, dt.date):
-        tradedate = tradedate.isoformat()
-    else:
-        pass  # Assume it's already a string
-
     client = get_mongo_client()
-    cursor = client["trade"].find({"accountid":accountid,"tradedate":tradedate})
-    trade_ctp = pd.DataFrame([item for item in cursor])
-    if len(trade_ctp):
-        trade_ctp = trade_ctp.sort_values(by=["createtime"], ascending=False)
-        headers_trade = ["accountid","code","exchange","direction","offset","price","volume","order_id","tradeid","createtime"]
-        trade_ctp["code"] = trade_ctp["symbol"]
-        trade_ctp = trade_ctp[headers_trade]
-
-        # Map Chinese direction to English for frontend compatibility
-        direction_map = {
-            "多": "long",
-            "空": "short",
-            "long": "long",
-            "short": "short",
-            "买": "long",
-            "卖": "short"
-        }
-        trade_ctp['direction'] = trade_ctp['direction'].map(direction_map).fillna(trade_ctp['direction'])
-
-        return trade_ctp
-    else:
-        return None
+    docs = TRADE_QUERY.fetch(client, trades_filter(accountid, tradedate))
+    return build_trades_frame(docs, TRADE_QUERY.sort)
 
 # def get_account_his(accountid: str, start_date: dt.date | None = None) -> list:
 #     """
@@ -223,113 +514,57 @@ def get_account_his(accountid: str, days: int = 5, start_date: dt.date | None =
         开始日期, 默认是当天.
     """
     client = get_mongo_client()
-    if start_date is None:
-        start_date = va.get_shifted_tradedate(va.tradedate_now(), days)
-
-    start = dt.datetime.combine(start_date, dt.time(15,15,0)).isoformat(sep=" ")
+    docs = ACCOUNT_HIS_QUERY.fetch(client, account_his_filter(accountid, days, start_date))
+    return build_account_his_frame(docs)
 
-    cursor = client.account_his.find({
-        "accountid": accountid,
-        "updatetime": {"$gte": start}
-    })
+def get_account_his_multi(accounts: list[str], days: int = 5, start_date: dt.date | None = None) -> Dict[str, pd.DataFrame]:
+    """
+    一次查询返回多个账户的资金历史, 按账户ID拆分.
 
-    # 转换为列表以检查是否为空
-    cursor_list = list(cursor)
+    Parameters
+    ----------
+    accounts
+        账户ID列表.
+    days
+        返回多少天的历史, 默认5天, 当start_date不为None时忽略此参数.
+    start_date
+        开始日期.
+    """
+    client = get_mongo_client()
+    docs = ACCOUNT_HIS_QUERY.fetch(client, account_his_filter(accounts, days, start_date))
+    return split_account_his_frame(build_account_his_frame(docs), accounts)
 
-    # 如果没有数据，返回空的DataFrame
-    if not cursor_list:
-        return pd.DataFrame(columns=["accountid", "balance"]).set_index(pd.DatetimeIndex([], name="updatetime"))
+def get_account_his_range(accounts: list[str], start: str, end: str | None = None) -> pd.DataFrame:
+    """返回多个账户在[start, end)区间内的资金历史(未拆分)."""
+    client = get_mongo_client()
+    docs = ACCOUNT_HIS_QUERY.fetch(client, account_his_range_filter(accounts, start, end))
+    return build_account_his_frame(docs)
 
-    data = pl.DataFrame(cursor_list).with_columns([
-        pl.col("updatetime").str.strptime(pl.Datetime, format="%Y-%m-%d %H:%M:%S"),
-        pl.col("updatetime").str.strptime(pl.Datetime, format="%Y-%m-%d %H:%M:%S").dt.time().alias("time")
-    ]).filter(
-        # 夜盘：21:00-23:59 或 00:00-02:30
-        (pl.col("time") >= dt.time(21,0)) |
-        (pl.col("time") <= dt.time(2,30)) |
-        # 上午：09:00-11:30
-        ((pl.col("time") >= dt.time(9,0)) & (pl.col("time") <= dt.time(11,30))) |
-        # 下午：13:00-15:15
-        ((pl.col("time") >= dt.time(13,0)) & (pl.col("time") <= dt.time(15,15)))
-    ).select(["accountid", "updatetime", "balance"]).to_pandas().set_index("updatetime")
+def get_account_his_after(watermarks: Dict[str, str]) -> pd.DataFrame:
+    """
+    增量返回资金历史(未拆分).
 
-    return data
+    Parameters
+    ----------
+    watermarks
+        账户ID到高水位updatetime字符串的映射, 返回不早于高水位的样本(含高水位那一秒).
+    """
+    client = get_mongo_client()
+    docs = ACCOUNT_HIS_QUERY.fetch(client, account_his_after_filter(watermarks))
+    return build_account_his_frame(docs)
 
-def get_orders_multi(accounts: list[str], tradedate: str | dt.date | None = None, is_special: bool | None = None) -> pd.DataFrame | None:
+def get_orders_multi(accounts: list[str], tradedate: str | dt.date | None = None, is_special: bool | None = None, limit: int | None = None) -> pd.DataFrame | None:
     """
-    获取多个账户的订单信息.
+    获取多个账户的订单信息, limit限制返回最新的多少条.
     """
-    if tradedate is None:
-        tradedate = va.tradedate_now().isoformat()
-    elif isinstance(tradedate, dt.date):
-        tradedate = tradedate.isoformat()
-    else:
-        pass # Assume it's already a string
-
     client = get_mongo_client()
+    docs = ORDER_QUERY.fetch(client, orders_filter(accounts, tradedate, is_special), limit)
+    return build_orders_frame(docs, ORDER_QUERY.sort)
 
-    _filter = {"accountid":{"$in":accounts},"tradedate":tradedate}
-    if is_special is not None:
-        if is_special:
-            _filter["status"] = {"$in":["提交中","未成交","部分成交","已撤销","拒单"]}
-        else:
-            _filter["status"] = "全部成交"
-
-    cursor = client["order"].find(_filter)
-    order_ctp = pd.DataFrame([item for item in cursor])
-
-    if len(order_ctp):
-        order_ctp = order_ctp.sort_values(by=["updatetime"], ascending=False)
-        headers_order = ["accountid","code","exchange","direction","offset","price","volume","order_id","type","traded","status","createtime","updatetime"]
-        order_ctp["code"] = order_ctp["symbol"]
-        order_ctp = order_ctp[headers_order]
-
-        # Map Chinese direction to English for frontend compatibility
-        direction_map = {
-            "多": "long",
-            "空": "short",
-            "long": "long",
-            "short": "short",
-            "买": "long",
-            "卖": "short"
-        }
-        order_ctp['direction'] = order_ctp['direction'].map(direction_map).fillna(order_ctp['direction'])
-
-        return order_ctp
-    else:
-        return None
-
-def get_trades_multi(accounts: list[str], tradedate: str | dt.date | None = None) -> pd.DataFrame | None:
+def get_trades_multi(accounts: list[str], tradedate: str | dt.date | None = None, limit: int | None = None) -> pd.DataFrame | None:
     """
-    获取多个账户的成交信息.
+    获取多个账户的成交信息, limit限制返回最新的多少条.
     """
-    if tradedate is None:
-        tradedate = va.tradedate_now().isoformat()
-    elif isinstance(tradedate, dt.date):
-        tradedate = tradedate.isoformat()
-    else:
-        pass # Assume it's already a string
-
     client = get_mongo_client()
-    cursor = client["trade"].find({"accountid":{"$in":accounts},"tradedate":tradedate})
-    trade_ctp = pd.DataFrame([item for item in cursor])
-    if len(trade_ctp):
-        trade_ctp = trade_ctp.sort_values(by=["createtime"], ascending=False)
-        headers_trade = ["accountid","code","exchange","direction","offset","price","volume","order_id","tradeid","createtime"]
-        trade_ctp["code"] = trade_ctp["symbol"]
-        trade_ctp = trade_ctp[headers_trade]
-
-        # Map Chinese direction to English for frontend compatibility
-        direction_map = {
-            "多": "long",
-            "空": "short",
-            "long": "long",
-            "short": "short",
-            "买": "long",
-            "卖": "short"
-        }
-        trade_ctp['direction'] = trade_ctp['direction'].map(direction_map).fillna(trade_ctp['direction'])
-
-        return trade_ctp
-    else:
-        return None
\ No newline at end of file
+    docs = TRADE_QUERY.fetch(client, trades_filter(accounts, tradedate), limit)
+    return build_trades_frame(docs, TRADE_QUERY.sort)
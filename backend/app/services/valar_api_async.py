@@ -0,0 +1,99 @@
+"""Async counterparts of the valar_api fetchers, backed by PyMongo's asyncio client.
+
+Documents are read on the event loop; building the frames from them is CPU
+work and runs on the bounded executor of the fetcher's workload class
+(history for account_his, realtime for the rest, as in ValarService).
+"""
+from typing import Dict
+import datetime as dt
+from valar.dependencies import pandas as pd
+from ..core.executors import history_executor, realtime_executor
+from ..core.mongo import get_async_database
+from .valar_api import (
+    ORDER_QUERY,
+    SPECIAL_ORDER_QUERY,
+    TRADE_QUERY,
+    ACCOUNT_HIS_QUERY,
+    account_summary_pipeline,
+    orders_filter,
+    trades_filter,
+    account_his_filter,
+    account_his_range_filter,
+    account_his_after_filter,
+    build_accounts_frame,
+    build_orders_frame,
+    build_trades_frame,
+    build_account_his_frame,
+    split_account_his_frame,
+)
+
+
+async def get_accounts(accounts: Dict[str, int | float]) -> pd.DataFrame:
+    """异步获取所有账户的信息, 参数同 valar_api.get_accounts."""
+    db = get_async_database()
+    cursor = await db["account"].aggregate(account_summary_pipeline(list(accounts.keys())))
+    return await realtime_executor.run(build_accounts_frame, await cursor.to_list(), accounts)
+
+
+async def get_special_orders(accounts: str | list[str], tradedate: str | dt.date | None = None, limit: int | None = None) -> pd.DataFrame | None:
+    """异步返回多个账户的特殊状态订单."""
+    accounts = [accounts] if isinstance(accounts, str) else accounts
+    db = get_async_database()
+    docs = await SPECIAL_ORDER_QUERY.find(db, orders_filter(accounts, tradedate, is_special=True), limit).to_list()
+    return await realtime_executor.run(build_orders_frame, docs, SPECIAL_ORDER_QUERY.sort)
+
+
+async def get_orders(accountid: str, tradedate: str | dt.date | None = None, is_special: bool = False) -> pd.DataFrame | None:
+    """异步返回某账户的订单."""
+    db = get_async_database()
+    docs = await ORDER_QUERY.find(db, orders_filter(accountid, tradedate, is_special)).to_list()
+    return await realtime_executor.run(build_orders_frame, docs, ORDER_QUERY.sort)
+
+
+async def get_trades(accountid: str, tradedate: str | dt.date | None = None) -> pd.DataFrame | None:
+    """异步返回某账户的成交."""
+    db = get_async_database()
+    docs = await TRADE_QUERY.find(db, trades_filter(accountid, tradedate)).to_list()
+    return await realtime_executor.run(build_trades_frame, docs, TRADE_QUERY.sort)
+
+
+async def get_account_his(accountid: str, days: int = 5, start_date: dt.date | None = None) -> pd.DataFrame:
+    """异步返回某账户的资金历史."""
+    db = get_async_database()
+    docs = await ACCOUNT_HIS_QUERY.find(db, account_his_filter(accountid, days, start_date)).to_list()
+    return await history_executor.run(build_account_his_frame, docs)
+
+
+async def get_account_his_multi(accounts: list[str], days: int = 5, start_date: dt.date | None = None) -> Dict[str, pd.DataFrame]:
+    """异步一次查询多个账户的资金历史, 按账户ID拆分."""
+    db = get_async_database()
+    docs = await ACCOUNT_HIS_QUERY.find(db, account_his_filter(accounts, days, start_date)).to_list()
+    return await history_executor.run(lambda: split_account_his_frame(build_account_his_frame(docs), accounts))
+
+
+async def get_account_his_range(accounts: list[str], start: str, end: str | None = None) -> pd.DataFrame:
+    """异步返回多个账户在[start, end)区间内的资金历史."""
+    db = get_async_database()
+    docs = await ACCOUNT_HIS_QUERY.find(db, account_his_range_filter(accounts, start, end)).to_list()
+    return await history_executor.run(build_account_his_frame, docs)
+
+
+async def get_account_his_after(watermarks: Dict[str, str]) -> pd.DataFrame:
+    """异步增量返回不早于各账户高水位的资金历史."""
+    db = get_async_database()
+    docs = await ACCOUNT_HIS_QUERY.find(db, account_his_after_filter(watermarks)).to_list()
+    return await history_executor.run(build_account_his_frame, docs)
+
+
+async def get_orders_multi(accounts: list[str], tradedate: str | dt.date | None = None, is_special: bool | None = None, limit: int | None = None) -> pd.DataFrame | None:
+    """异步获取多个账户的订单信息."""
+    db = get_async_database()
+    docs = await ORDER_QUERY.find(db, orders_filter(accounts, tradedate, is_special), limit).to_list()
+    return await realtime_executor.run(build_orders_frame, docs, ORDER_QUERY.sort)
+
+
+async def get_trades_multi(accounts: list[str], tradedate: str | dt.date | None = None, limit: int | None = None) -> pd.DataFrame | None:
+    """异步获取多个账户的成交信息."""
+    db = get_async_database()
+    docs = await TRADE_QUERY.find(db, trades_filter(accounts, tradedate), limit).to_list()
+    return await realtime_executor.run(build_trades_frame, docs, TRADE_QUERY.sort)
@@ -1,13 +1,32 @@
 """Valar data service integration."""
-import asyncio
-from typing import List, Dict, Optional, Any
-from datetime import datetime, date
+from typing import List, Dict, Optional
+from datetime import datetime
 import pandas as pd
-from . import valar_api
+from . import valar_api, valar_api_async
+from .history_cache import BalanceHistoryCache
+from .balance_pyramid import BalancePyramid
+from .live_book import LiveBook
+from .snapshot import SnapshotRefresher
+from ..core.config import settings
+from ..core.executors import ExecutorBusy, analytics_executor, history_executor, realtime_executor
+from ..core.mongo import async_backend_enabled
+from ..core.shared_cache import shared_cache
+from ..utils.encoded_responses import mark_fallback
+from ..utils.single_flight import SingleFlight, freeze
+from ..utils.ttl_cache import TTLCache
+from ..utils.json_response import EncodedJSON, EMPTY_LIST, dumps_frame, frame_records
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fetchers run on the history executor, so long history queries cannot starve live reads
+HISTORY_FETCHERS = {"get_account_his", "get_account_his_multi", "get_account_his_range", "get_account_his_after"}
+
+SUMMARY_COLUMNS = [
+    "account_id", "balance", "float_pnl", "total_pnl", "margin", "margin_rate",
+    "available", "initial_capital", "frozen", "update_time", "profit_rate",
+]
+
 
 class ValarService:
     """Service for interacting with Valar API and MongoDB data."""
@@ -15,50 +34,149 @@ class ValarService:
     def __init__(self):
         """Initialize the Valar service."""
         self.mongo_client = None
+        self.single_flight = SingleFlight()
+        self.response_cache = TTLCache(
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            max_stale=settings.RESPONSE_CACHE_MAX_STALE_SECONDS,
+        )
+        self.cache_ttls = {
+            "accounts": settings.RESPONSE_CACHE_TTL_ACCOUNTS,
+            "positions": settings.RESPONSE_CACHE_TTL_POSITIONS,
+            "orders": settings.RESPONSE_CACHE_TTL_ORDERS,
+            "trades": settings.RESPONSE_CACHE_TTL_TRADES,
+            "history": settings.RESPONSE_CACHE_TTL_HISTORY,
+        }
+        self.history_cache = BalanceHistoryCache(
+            self._fetch,
+            max_days=settings.HISTORY_CACHE_DAYS,
+            refresh_interval=settings.HISTORY_REFRESH_SECONDS,
+        )
+        self.balance_pyramid = BalancePyramid(
+            self._fetch,
+            refresh_interval=settings.HISTORY_REFRESH_SECONDS,
+        )
+        self.live_book = LiveBook()
+        self.snapshots = SnapshotRefresher(
+            self._fetch_shared,
+            interval=settings.SNAPSHOT_REFRESH_SECONDS,
+            max_age=settings.SNAPSHOT_MAX_AGE_SECONDS,
+            history=settings.SNAPSHOT_HISTORY,
+        )
+        shared_cache.add_listener(lambda scope: self.response_cache.clear())
+
+    async def _fetch(self, name: str, *args):
+        """Call a valar_api fetcher, sharing one call among identical concurrent ones.
+
+        Every upstream read (positions, accounts, orders, trades and history)
+        goes through here, so concurrent requests with the same fetcher and
+        arguments (accounts, tradedate, filters) await a single fetch.
+        """
+        return await self.single_flight.do(name, (name, freeze(args)), lambda: self._fetch_upstream(name, *args))
 
-    async def get_account_summary(self, account_ids: List[str], initial_capitals: Dict[str, float]) -> List[Dict]:
+    async def _cached(self, dataset: str, key: tuple, load):
+        """Read through the response cache with the TTL of ``dataset``.
+
+        Keys carry the requested accounts, which callers have already reduced
+        to the user's permitted set, so entries are never shared across
+        account sets. Misses read through the cache shared by all workers.
         """
-        Get account summary for multiple accounts.
+        ttl = self.cache_ttls.get(dataset, 0)
+        if not settings.RESPONSE_CACHE_ENABLED or ttl <= 0:
+            return await load()
+        key = (dataset, *key)
+        return await self.response_cache.get(dataset, key, ttl, lambda: shared_cache.get_or_load(key, ttl, load))
+
+    async def _cached_fetch(self, dataset: str, name: str, *args):
+        """Call a valar_api fetcher through the response cache of ``dataset``."""
+        return await self._cached(dataset, (name, freeze(args)), lambda: self._fetch(name, *args))
+
+    async def _fetch_shared(self, name: str, *args):
+        """Snapshot fetch, loaded by one worker per refresh interval when the cache is shared."""
+        return await shared_cache.get_or_load(
+            ("snapshot", name, freeze(args)),
+            settings.SNAPSHOT_REFRESH_SECONDS,
+            lambda: self._fetch(name, *args),
+        )
+
+    async def _fetch_upstream(self, name: str, *args):
+        """Call a valar_api fetcher on the configured data backend.
+
+        With the async backend the fetch runs on the event loop through the
+        asyncio Mongo driver; otherwise the sync function runs in a thread.
+        Fetchers without an async counterpart always use a thread. While the
+        change-stream book is live, the fetchers it covers read from memory.
+        History fetchers are bounded by the history executor and all others
+        by the realtime one, in either mode.
+        """
+        executor = history_executor if name in HISTORY_FETCHERS else realtime_executor
+        if self.live_book.serves(name, args):
+            return await realtime_executor.run(getattr(self.live_book, name), *args)
+        if async_backend_enabled() and hasattr(valar_api_async, name):
+            return await executor.run_async(getattr(valar_api_async, name), *args)
+        return await executor.run(getattr(valar_api, name), *args)
+
+    async def get_account_summary_frame(self, account_ids: List[str], initial_capitals: Dict[str, float]) -> pd.DataFrame:
+        """
+        Get account summary for multiple accounts as a DataFrame.
 
         Args:
             account_ids: List of account IDs
             initial_capitals: Dictionary mapping account IDs to their initial capital
 
         Returns:
-            List of account summaries
+            One row per account in the order of initial_capitals, empty on error
         """
         try:
-            # Run synchronous function in thread pool
-            df = await asyncio.to_thread(
-                valar_api.get_accounts,
-                initial_capitals
-            )
+            snapshot = self.snapshots.current(list(initial_capitals))
+            if snapshot is not None:
+                df = snapshot.accounts_frame(initial_capitals)
+            else:
+                # Fetch on the configured backend (thread pool or asyncio driver)
+                df = await self._cached_fetch(
+                    "accounts",
+                    "get_accounts",
+                    initial_capitals
+                )
 
             if df is None or df.empty:
-                return []
-
-            # Convert DataFrame to list of dictionaries
-            accounts = []
-            for _, row in df.iterrows():
-                account = {
-                    "account_id": row["accountid"],
-                    "balance": float(row["balance"]),
-                    "float_pnl": float(row["float_pnl"]),
-                    "total_pnl": float(row["total_pnl"]),
-                    "margin": float(row["margin"]),
-                    "margin_rate": row["margin%"],
-                    "available": float(row["available"]),
-                    "initial_capital": float(row["init_cash"]),
-                    "frozen": float(row["frozen"]),
-                    "update_time": row["updatetime"],
-                    "profit_rate": ((row["balance"] - row["init_cash"]) / row["init_cash"] * 100) if row["init_cash"] > 0 else 0
-                }
-                accounts.append(account)
-
-            return accounts
+                return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+            init_cash = df["init_cash"].astype(float)
+            profit_rate = ((df["balance"] - init_cash) / init_cash * 100).where(init_cash > 0, 0.0)
+            return pd.DataFrame({
+                "account_id": df["accountid"],
+                "balance": df["balance"].astype(float),
+                "float_pnl": df["float_pnl"].astype(float),
+                "total_pnl": df["total_pnl"].astype(float),
+                "margin": df["margin"].astype(float),
+                "margin_rate": df["margin%"],
+                "available": df["available"].astype(float),
+                "initial_capital": init_cash,
+                "frozen": df["frozen"].astype(float),
+                "update_time": df["updatetime"],
+                "profit_rate": profit_rate,
+            }).reset_index(drop=True)
+        except ExecutorBusy:
+            # Surfaces as 503 so clients retry instead of showing empty data
+            raise
         except Exception as e:
             logger.error(f"Error getting account summary: {e}")
-            return []
+            # Served to this request only, never cached as the current data
+            mark_fallback()
+            return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    async def get_account_summary(self, account_ids: List[str], initial_capitals: Dict[str, float]) -> List[Dict]:
+        """
+        Get account summary for multiple accounts.
+
+        Args:
+            account_ids: List of account IDs
+            initial_capitals: Dictionary mapping account IDs to their initial capital
+
+        Returns:
+            List of account summaries
+        """
+        return frame_records(await self.get_account_summary_frame(account_ids, initial_capitals))
 
     async def get_dashboard_summary(self, account_ids: List[str], initial_capitals: Dict[str, float]) -> Dict:
         """
@@ -71,9 +189,20 @@ class ValarService:
         Returns:
             Dashboard summary dictionary
         """
-        accounts = await self.get_account_summary(account_ids, initial_capitals)
-        
-        if not accounts:
+        accounts = await self.get_account_summary_frame(account_ids, initial_capitals)
+        return self.summarize_accounts(accounts)
+
+    def summarize_accounts(self, accounts: pd.DataFrame) -> Dict:
+        """
+        Aggregate account summary rows into dashboard totals.
+
+        Args:
+            accounts: Frame returned by get_account_summary_frame
+
+        Returns:
+            Dashboard summary dictionary
+        """
+        if accounts.empty:
             return {
                 "total_balance": 0,
                 "net_profit": 0,
@@ -84,10 +213,10 @@ class ValarService:
                 "accounts_count": 0
             }
 
-        total_balance = sum(acc["balance"] for acc in accounts)
-        total_initial = sum(acc["initial_capital"] for acc in accounts)
-        total_margin = sum(acc["margin"] for acc in accounts)
-        total_available = sum(acc["available"] for acc in accounts)
+        total_balance = float(accounts["balance"].sum())
+        total_initial = float(accounts["initial_capital"].sum())
+        total_margin = float(accounts["margin"].sum())
+        total_available = float(accounts["available"].sum())
 
         return {
             "total_balance": total_balance,
@@ -107,22 +236,31 @@ class ValarService:
             account_ids: List of account IDs
 
         Returns:
-            Dictionary containing positions and metadata
+            Dictionary containing positions (pre-encoded JSON array) and metadata
         """
         try:
-            # Use the unified get_positions function
-            df = await asyncio.to_thread(
-                valar_api.get_positions,
-                account_ids
-            )
+            snapshot = self.snapshots.current(account_ids)
+            if snapshot is not None:
+                df = snapshot.positions_frame(account_ids)
+            else:
+                # Use the unified get_positions function
+                df = await self._cached_fetch(
+                    "positions",
+                    "get_positions",
+                    account_ids
+                )
 
         except KeyError:
             # Some upstream data sources raise KeyError when no positions exist for the accounts
             logger.info("No positions returned for accounts %s", account_ids)
             return {"positions": [], "update_time": datetime.now().isoformat()}
 
+        except ExecutorBusy:
+            # Surfaces as 503 so clients retry instead of showing empty data
+            raise
         except Exception as e:
             logger.error(f"Error getting positions: {e}")
+            mark_fallback()
             return {"positions": [], "update_time": datetime.now().isoformat()}
 
         if df is None or df.empty:
@@ -133,21 +271,12 @@ class ValarService:
         if 'margin' in df.columns:
             df = df.sort_values('margin', ascending=False).reset_index(drop=True)
 
-        # Convert DataFrame to list of dictionaries
-        positions = df.to_dict('records')
-
-        # Process any NaN values
-        for pos in positions:
-            for key, value in pos.items():
-                if pd.isna(value):
-                    pos[key] = None
-
         return {
-            "positions": positions,
+            "positions": dumps_frame(df),
             "update_time": datetime.now().isoformat()
         }
 
-    async def get_orders(self, account_id: str, tradedate: str, is_special: bool) -> List[Dict]:
+    async def get_orders(self, account_id: str, tradedate: str, is_special: bool) -> EncodedJSON:
         """
         Get orders for an account.
 
@@ -156,33 +285,33 @@ class ValarService:
             is_special: If True, return only special status orders
 
         Returns:
-            List of orders
+            JSON array of orders, already encoded
         """
         try:
-            df = await asyncio.to_thread(
-                valar_api.get_orders,
-                account_id,
-                tradedate,
-                is_special
-            )
+            snapshot = self.snapshots.current([account_id], valar_api.normalize_tradedate(tradedate))
+            if snapshot is not None:
+                df = snapshot.orders_frame([account_id], is_special)
+            else:
+                df = await self._cached_fetch(
+                    "orders",
+                    "get_orders",
+                    account_id,
+                    tradedate,
+                    is_special
+                )
 
             if df is None or df.empty:
-                return []
-
-            orders = df.to_dict('records')
-
-            # Process any NaN values
-            for order in orders:
-                for key, value in order.items():
-                    if pd.isna(value):
-                        order[key] = None
+                return EMPTY_LIST
 
-            return orders
+            return dumps_frame(df)
+        except ExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"Error getting orders: {e}")
-            return []
+            mark_fallback()
+            return EMPTY_LIST
 
-    async def get_trades(self, account_id: str, tradedate: str = None) -> List[Dict]:
+    async def get_trades(self, account_id: str, tradedate: str = None) -> EncodedJSON:
         """
         Get trades for an account.
 
@@ -191,32 +320,32 @@ class ValarService:
             tradedate: Trade date (optional)
 
         Returns:
-            List of trades
+            JSON array of trades, already encoded
         """
         try:
-            df = await asyncio.to_thread(
-                valar_api.get_trades,
-                account_id,
-                tradedate
-            )
+            snapshot = self.snapshots.current([account_id], valar_api.normalize_tradedate(tradedate))
+            if snapshot is not None:
+                df = snapshot.trades_frame([account_id])
+            else:
+                df = await self._cached_fetch(
+                    "trades",
+                    "get_trades",
+                    account_id,
+                    tradedate
+                )
 
             if df is None or df.empty:
-                return []
-
-            trades = df.to_dict('records')
+                return EMPTY_LIST
 
-            # Process any NaN values
-            for trade in trades:
-                for key, value in trade.items():
-                    if pd.isna(value):
-                        trade[key] = None
-
-            return trades
+            return dumps_frame(df)
+        except ExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"Error getting trades: {e}")
-            return []
+            mark_fallback()
+            return EMPTY_LIST
 
-    async def get_special_orders(self, account_ids: List[str]) -> List[Dict]:
+    async def get_special_orders(self, account_ids: List[str]) -> EncodedJSON:
         """
         Get special status orders for multiple accounts.
 
@@ -224,59 +353,86 @@ class ValarService:
             account_ids: List of account IDs
 
         Returns:
-            List of special orders
+            JSON array of special orders, already encoded
         """
         try:
-            df = await asyncio.to_thread(
-                valar_api.get_special_orders,
-                account_ids
-            )
+            snapshot = self.snapshots.current(account_ids, valar_api.normalize_tradedate(None))
+            if snapshot is not None:
+                df = snapshot.orders_frame(account_ids, is_special=True, by_createtime=True)
+            else:
+                df = await self._cached_fetch(
+                    "orders",
+                    "get_special_orders",
+                    account_ids
+                )
 
             if df is None or df.empty:
-                return []
+                return EMPTY_LIST
 
-            orders = df.to_dict('records')
-
-            # Process any NaN values
-            for order in orders:
-                for key, value in order.items():
-                    if pd.isna(value):
-                        order[key] = None
-
-            return orders
+            return dumps_frame(df)
+        except ExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"Error getting special orders: {e}")
-            return []
+            mark_fallback()
+            return EMPTY_LIST
 
-    async def get_account_history(self, account_id: str, start_date: Optional[date] = None) -> List[Dict]:
+    async def get_account_history(self, account_id: str, days: int = 5) -> List[Dict]:
         """
         Get account balance history.
 
         Args:
             account_id: Account ID
-            start_date: Start date for history
+            days: Number of trading days to return
 
         Returns:
             List of historical account data
         """
         try:
-            history = await asyncio.to_thread(
-                valar_api.get_account_his,
-                account_id,
-                start_date
+            histories = await self._cached(
+                "history",
+                ((account_id,), days, "raw"),
+                lambda: self.history_cache.get([account_id], days),
             )
-
-            # Process MongoDB ObjectId if present
-            for record in history:
-                if '_id' in record:
-                    record['_id'] = str(record['_id'])
-
-            return history
+            history = histories[account_id]
+            return [
+                {"updatetime": timestamp.isoformat(), "balance": float(balance)}
+                for timestamp, balance in zip(history.index, history["balance"])
+            ]
+        except ExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"Error getting account history: {e}")
             return []
 
-    async def get_orders_multi(self, account_ids: List[str], tradedate: str, is_special: bool | None = None) -> List[Dict]:
+    async def get_accounts_history(self, account_ids: List[str], days: int = 5, resolution: str = "raw") -> Dict[str, pd.DataFrame]:
+        """
+        Get balance history for multiple accounts.
+
+        Raw samples come from the incremental history cache; other resolutions
+        are read from the pre-aggregated balance bars.
+
+        Args:
+            account_ids: List of account IDs
+            days: Number of trading days to return
+            resolution: "raw", "1m", "5m", "1h" or "1d"
+
+        Returns:
+            Dictionary mapping account IDs to balance frames indexed by updatetime
+        """
+        try:
+            if resolution != "raw":
+                load = lambda: self.balance_pyramid.get(account_ids, days, resolution)
+            else:
+                load = lambda: self.history_cache.get(account_ids, days)
+            return await self._cached("history", (tuple(account_ids), days, resolution), load)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting multi-account history: {e}")
+            return {}
+
+    async def get_orders_multi(self, account_ids: List[str], tradedate: str, is_special: bool | None = None) -> EncodedJSON:
         """
         Get orders for multiple accounts.
 
@@ -286,38 +442,33 @@ class ValarService:
             is_special: If True, return only special status orders, if False return all orders, if None ignore special status
 
         Returns:
-            List of orders
+            JSON array of orders, already encoded
         """
         try:
-            df = await asyncio.to_thread(
-                valar_api.get_orders_multi,
-                account_ids,
-                tradedate,
-                is_special
-            )
+            snapshot = self.snapshots.current(account_ids, valar_api.normalize_tradedate(tradedate))
+            if snapshot is not None:
+                df = snapshot.orders_frame(account_ids, is_special)
+            else:
+                df = await self._cached_fetch(
+                    "orders",
+                    "get_orders_multi",
+                    account_ids,
+                    tradedate,
+                    is_special
+                )
 
             if df is None or df.empty:
-                return []
-
-            # Ensure orders are sorted by updatetime descending (latest first)
-            # This provides protection against external library changes
-            if 'updatetime' in df.columns:
-                df = df.sort_values('updatetime', ascending=False).reset_index(drop=True)
-
-            orders = df.to_dict('records')
+                return EMPTY_LIST
 
-            # Process any NaN values
-            for order in orders:
-                for key, value in order.items():
-                    if pd.isna(value):
-                        order[key] = None
-
-            return orders
+            return dumps_frame(df)
+        except ExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"Error getting multi-account orders: {e}")
-            return []
+            mark_fallback()
+            return EMPTY_LIST
 
-    async def get_trades_multi(self, account_ids: List[str], tradedate: str) -> List[Dict]:
+    async def get_trades_multi(self, account_ids: List[str], tradedate: str) -> EncodedJSON:
         """
         Get trades for multiple accounts.
 
@@ -326,35 +477,108 @@ class ValarService:
             tradedate: Trade date string
 
         Returns:
-            List of trades
+            JSON array of trades, already encoded
         """
         try:
-            df = await asyncio.to_thread(
-                valar_api.get_trades_multi,
-                account_ids,
-                tradedate
-            )
+            snapshot = self.snapshots.current(account_ids, valar_api.normalize_tradedate(tradedate))
+            if snapshot is not None:
+                df = snapshot.trades_frame(account_ids)
+            else:
+                df = await self._cached_fetch(
+                    "trades",
+                    "get_trades_multi",
+                    account_ids,
+                    tradedate
+                )
 
             if df is None or df.empty:
-                return []
+                return EMPTY_LIST
+
+            return dumps_frame(df)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting multi-account trades: {e}")
+            mark_fallback()
+            return EMPTY_LIST
 
-            # Ensure trades are sorted by createtime descending (latest first)
-            # This provides protection against external library changes
-            if 'createtime' in df.columns:
-                df = df.sort_values('createtime', ascending=False).reset_index(drop=True)
+    def get_data_version(self, account_ids: List[str], dataset: str, tradedate: Optional[str] = None) -> Optional[int]:
+        """
+        Get the version of the data a read of ``dataset`` is served from.
+
+        Read it before the data itself: a later refresh only makes the data
+        newer than the version, and replaying changes is idempotent.
 
-            trades = df.to_dict('records')
+        Args:
+            account_ids: List of account IDs
+            dataset: "orders", "trades" or "positions"
+            tradedate: Trade date of orders and trades, defaults to today
 
-            # Process any NaN values
-            for trade in trades:
-                for key, value in trade.items():
-                    if pd.isna(value):
-                        trade[key] = None
+        Returns:
+            Snapshot version, None when reads go to Mongo directly
+        """
+        if dataset == "positions":
+            return self.snapshots.version(account_ids)
+        return self.snapshots.version(account_ids, valar_api.normalize_tradedate(tradedate))
 
-            return trades
+    def get_content_version(self, account_ids: List[str], dataset: str, tradedate: Optional[str] = None) -> Optional[int]:
+        """
+        Get the version in which the data of ``dataset`` for the accounts last changed.
+
+        Unlike get_data_version it does not move while the accounts' rows stay
+        the same, so it can key encoded responses.
+
+        Args:
+            account_ids: List of account IDs
+            dataset: "accounts", "positions", "orders" or "trades"
+            tradedate: Trade date of orders and trades, defaults to today
+
+        Returns:
+            Snapshot version, None when reads go to Mongo directly
+        """
+        if dataset in ("accounts", "positions"):
+            return self.snapshots.content_version(dataset, account_ids)
+        return self.snapshots.content_version(dataset, account_ids, valar_api.normalize_tradedate(tradedate))
+
+    async def get_changes(self, account_ids: List[str], dataset: str, since: int, tradedate: Optional[str] = None, is_special: Optional[bool] = None) -> Optional[Dict]:
+        """
+        Get the rows of a dataset changed since a data version.
+
+        Args:
+            account_ids: List of account IDs
+            dataset: "orders", "trades" or "positions"
+            since: Version the client already has
+            tradedate: Trade date of orders and trades, defaults to today
+            is_special: Order status filter, as in get_orders_multi
+
+        Returns:
+            Dictionary with the new version, key columns and inserted, changed
+            and removed rows (pre-encoded), or None when a full reload is needed
+        """
+        try:
+            if dataset != "positions":
+                tradedate = valar_api.normalize_tradedate(tradedate)
+            changes = await analytics_executor.run(
+                self.snapshots.changes, dataset, account_ids, since, tradedate, is_special
+            )
+        except ExecutorBusy:
+            raise
         except Exception as e:
-            logger.error(f"Error getting multi-account trades: {e}")
-            return []
+            logger.error(f"Error getting {dataset} changes: {e}")
+            return None
+
+        if changes is None:
+            return None
+
+        return {
+            "version": changes["version"],
+            "since": since,
+            "full": False,
+            "key": changes["key"],
+            "inserted": dumps_frame(changes["inserted"]),
+            "changed": dumps_frame(changes["changed"]),
+            "removed": dumps_frame(changes["removed"]),
+        }
 
 
 # Create global service instance
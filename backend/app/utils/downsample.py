@@ -0,0 +1,73 @@
+"""Shape-preserving downsampling for time series charts."""
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of the points to keep, always including the first and
+    last point. ``x`` must be sorted ascending and numeric (e.g. int64 epoch).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket edges for the n-2 interior points
+    edges = np.arange(threshold - 1, dtype=np.int64) * (n - 2) // (threshold - 2) + 1
+    # Average point of each bucket, used as the third vertex of the triangle
+    counts = np.diff(edges)
+    x_sum = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    y_sum = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    x_avg = x_sum / counts
+    y_avg = y_sum / counts
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 1 < threshold - 2:
+            cx, cy = x_avg[i + 1], y_avg[i + 1]
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs(
+            (x[a] - cx) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (cy - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Min/max bucketing: keep the lowest and highest point of each bucket.
+
+    Returns sorted indices, at most ``threshold`` of them.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+
+    buckets = threshold // 2
+    edges = np.arange(buckets + 1, dtype=np.int64) * n // buckets
+    y = np.asarray(y, dtype=np.float64)
+    bucket_of = np.repeat(np.arange(buckets), np.diff(edges))
+    # Sort by (bucket, value) to find the extremes of every bucket in one pass
+    order = np.lexsort((y, bucket_of))
+    lows = order[edges[:-1]]
+    highs = order[edges[1:] - 1]
+    return np.unique(np.concatenate([lows, highs]))
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int, method: str = "lttb") -> np.ndarray:
+    """Return the indices to keep so that at most ``max_points`` remain."""
+    if method == "minmax":
+        return minmax(y, max_points)
+    return lttb(x, y, max_points)
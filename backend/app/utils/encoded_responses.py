@@ -0,0 +1,138 @@
+"""Response bodies encoded once per data change and shared by every request."""
+import gzip
+import zlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from ..core.config import settings
+from .json_response import FastJSONResponse, dumps
+from .single_flight import SingleFlight
+
+
+# Set while a body is being built, so service fallbacks can keep it out of the cache
+_building: ContextVar[Optional[dict]] = ContextVar("encoded_response_build", default=None)
+
+
+def mark_fallback() -> None:
+    """Mark the response being built as a fallback (e.g. empty after an upstream error) so it is not cached."""
+    state = _building.get()
+    if state is not None:
+        state["fallback"] = True
+
+
+@dataclass
+class _Body:
+    version: int
+    body: bytes
+    gzipped: Optional[bytes] = None
+    # For bodies with per-response fields: the gzip stream of the body up to
+    # its closing brace and the compressor state after it
+    gzip_head: Optional[bytes] = None
+    gzip_state: Any = None
+
+
+class EncodedResponses:
+    """
+    Serialized response bodies keyed by (endpoint, account set, parameters).
+
+    Users with the same permitted accounts get identical payloads, so the
+    body is encoded once for a content version and reused until the version
+    changes; its gzip form is compressed once as well, the first time a
+    client accepts it. Reads without a version (not served from the
+    snapshot) are encoded per request as before.
+
+    Fields that differ per request (the response time and data version) are
+    appended to the cached object on every response instead of being part
+    of it. Bodies built from a fallback after an upstream error are served
+    to the requests that built them but never cached.
+    """
+
+    def __init__(self, max_entries: int = 512, gzip_min_bytes: int = 1024, gzip_level: int = 5):
+        self.max_entries = max_entries
+        self.gzip_min_bytes = gzip_min_bytes
+        self.gzip_level = gzip_level
+        self._entries: "OrderedDict[Hashable, _Body]" = OrderedDict()
+        self._flights = SingleFlight()
+        self._stats = {"hits": 0, "encodes": 0, "compressions": 0, "uncached": 0, "fallbacks": 0}
+
+    async def respond(
+        self,
+        request: Request,
+        key: tuple,
+        version: Optional[int],
+        build: Callable[[], Awaitable[Any]],
+        fields: Optional[Dict[str, Any]] = None,
+    ) -> Response:
+        """
+        Response for ``key`` at content ``version``, calling ``build`` only when not encoded yet.
+
+        ``fields`` are added to the top level of the object ``build`` returns
+        on this response only; ``build`` must not return them itself.
+        """
+        if version is None:
+            self._stats["uncached"] += 1
+            data = await build()
+            return FastJSONResponse({**data, **fields} if fields else data)
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        else:
+            entry = await self._flights.do(key[0], (key, version), lambda: self._encode(key, version, build))
+        return self._response(request, entry, fields)
+
+    def stats(self) -> Dict:
+        return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
+
+    async def _encode(self, key: tuple, version: int, build: Callable[[], Awaitable[Any]]) -> _Body:
+        state = {"fallback": False}
+        token = _building.set(state)
+        try:
+            entry = _Body(version, dumps(await build()))
+        finally:
+            _building.reset(token)
+        if state["fallback"]:
+            self._stats["fallbacks"] += 1
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._stats["encodes"] += 1
+        return entry
+
+    def _response(self, request: Request, entry: _Body, fields: Optional[Dict[str, Any]] = None) -> Response:
+        headers = {"Vary": "Accept-Encoding"}
+        accepts_gzip = len(entry.body) >= self.gzip_min_bytes and "gzip" in request.headers.get("accept-encoding", "")
+        if fields:
+            # Replace the closing brace of the cached object with the per-response fields
+            tail = dumps(fields)[1:]
+            if entry.body != b"{}":
+                tail = b"," + tail
+            if not accepts_gzip:
+                return Response(entry.body[:-1] + tail, media_type="application/json", headers=headers)
+            if entry.gzip_state is None:
+                compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+                entry.gzip_head = compressor.compress(entry.body[:-1]) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                entry.gzip_state = compressor
+                self._stats["compressions"] += 1
+            compressor = entry.gzip_state.copy()
+            body = entry.gzip_head + compressor.compress(tail) + compressor.flush()
+            return Response(body, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+        if accepts_gzip:
+            if entry.gzipped is None:
+                entry.gzipped = gzip.compress(entry.body, compresslevel=self.gzip_level, mtime=0)
+                self._stats["compressions"] += 1
+            return Response(entry.gzipped, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+
+encoded_responses = EncodedResponses(
+    max_entries=settings.ENCODED_RESPONSE_CACHE_ENTRIES,
+    gzip_min_bytes=settings.RESPONSE_GZIP_MIN_BYTES,
+)
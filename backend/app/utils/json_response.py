@@ -0,0 +1,68 @@
+"""Fast JSON encoding of DataFrames for API responses."""
+import datetime as dt
+from typing import Any, Dict, List
+
+import orjson
+import pandas as pd
+from fastapi.responses import Response
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class EncodedJSON(bytes):
+    """JSON text that is already serialized and is embedded as-is."""
+
+
+EMPTY_LIST = EncodedJSON(b"[]")
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (dt.datetime, dt.date)):
+        return obj.isoformat()
+    if isinstance(obj, pd.Timedelta):
+        return obj.total_seconds()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _column_values(column: pd.Series) -> List[Any]:
+    """Column as Python scalars with every missing value (NaN/NaT/None) as None."""
+    values = column.to_numpy(dtype=object)
+    missing = column.isna().to_numpy()
+    if missing.any():
+        # Arrow-backed columns convert to read-only arrays
+        values = values.copy()
+        values[missing] = None
+    return values.tolist()
+
+
+def frame_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Like ``df.to_dict("records")`` but with missing values mapped to None column-wise."""
+    names = [str(name) for name in df.columns]
+    columns = [_column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize ``content``, embedding EncodedJSON values without re-encoding them."""
+    if isinstance(content, EncodedJSON):
+        return content
+    if isinstance(content, dict) and any(isinstance(v, EncodedJSON) for v in content.values()):
+        members = [orjson.dumps(str(k)) + b":" + dumps(v) for k, v in content.items()]
+        return b"{" + b",".join(members) + b"}"
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def dumps_frame(df: pd.DataFrame) -> EncodedJSON:
+    """Encode a DataFrame as a JSON array of records."""
+    if df is None or df.empty:
+        return EMPTY_LIST
+    return EncodedJSON(dumps(frame_records(df)))
+
+
+class FastJSONResponse(Response):
+    """orjson response that skips jsonable_encoder and accepts pre-encoded parts."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,27 @@
+"""asyncio locks per key, for state that is only shared between calls on the same keys."""
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, Iterable
+
+
+class KeyedLocks:
+    """
+    One asyncio.Lock per key, created on first use.
+
+    ``hold(keys)`` takes the locks of all ``keys`` in sorted order, so calls
+    on overlapping key sets cannot deadlock, while calls on disjoint keys
+    (e.g. other accounts) never wait for each other. Keys must be sortable.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def hold(self, keys: Iterable[Hashable]) -> AsyncIterator[None]:
+        async with AsyncExitStack() as stack:
+            for key in sorted(set(keys)):
+                await stack.enter_async_context(self._locks.setdefault(key, asyncio.Lock()))
+            yield
+
+    def __len__(self) -> int:
+        return len(self._locks)
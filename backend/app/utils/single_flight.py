@@ -0,0 +1,74 @@
+"""Async single-flight: concurrent identical calls share one execution."""
+import asyncio
+import datetime as dt
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def freeze(value: Any) -> Hashable:
+    """Hashable form of call arguments; dicts and lists keep their order."""
+    if isinstance(value, dict):
+        return ("dict", tuple((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    if isinstance(value, dt.date):
+        return value.isoformat()
+    return value
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one in-flight task.
+
+    The first caller starts the task and later callers with the same key
+    await it too; the key is released as soon as the task finishes, so
+    results are never reused after the fact. The task is shielded, so a
+    caller that is cancelled (e.g. a client disconnect) does not cancel the
+    fetch for the others. Results are shared and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, label: str, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        stats = self._stats.setdefault(label, {"calls": 0, "flights": 0})
+        stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            stats["flights"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Retrieve the exception so it is not reported as unhandled when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        """Calls, upstream executions and the share of calls served by another call's flight."""
+        by_label = {
+            label: {**s, "coalesced": s["calls"] - s["flights"], "ratio": _ratio(s)}
+            for label, s in sorted(self._stats.items())
+        }
+        calls = sum(s["calls"] for s in self._stats.values())
+        flights = sum(s["flights"] for s in self._stats.values())
+        return {
+            "in_flight": len(self._inflight),
+            "calls": calls,
+            "flights": flights,
+            "coalesced": calls - flights,
+            "ratio": _ratio({"calls": calls, "flights": flights}),
+            "by_fetcher": by_label,
+        }
+
+
+def _ratio(stats: Dict[str, int]) -> float:
+    return round((stats["calls"] - stats["flights"]) / stats["calls"], 4) if stats["calls"] else 0.0
@@ -0,0 +1,81 @@
+"""Bounded LRU cache with per-entry TTL and stale-while-revalidate."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    LRU cache of awaited results, each stored with the TTL of its dataset.
+
+    A fresh entry is returned as is. An expired entry younger than
+    ``ttl + max_stale`` is returned right away while one background task
+    reloads it; older entries and misses are loaded inline. At most
+    ``max_entries`` entries are kept, the least recently used are evicted.
+    Cached values are shared and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_stale: float = 30.0):
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        # key -> (stored_at, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._evictions = 0
+
+    async def get(self, label: str, key: Hashable, ttl: float, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value of ``key``, loading it with ``load`` when missing or too old."""
+        stats = self._stats.setdefault(label, {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0})
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age < ttl:
+                self._entries.move_to_end(key)
+                stats["hits"] += 1
+                return value
+            if age < ttl + self.max_stale:
+                self._entries.move_to_end(key)
+                stats["stale_hits"] += 1
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(label, stats, key, load))
+                return value
+        stats["misses"] += 1
+        value = await load()
+        self._store(key, value)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self._evictions,
+            "refreshing": len(self._refreshing),
+            "datasets": dict(sorted(self._stats.items())),
+        }
+
+    async def _refresh(self, label: str, stats: Dict[str, int], key: Hashable, load: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            self._store(key, await load())
+            stats["refreshes"] += 1
+        except Exception as e:
+            # The stale entry stays until it is too old to serve, then it is loaded inline
+            stats["refresh_errors"] += 1
+            logger.error(f"Error refreshing cached {label}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
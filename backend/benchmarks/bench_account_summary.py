@@ -0,0 +1,111 @@
+"""
+Benchmark of the account summary path (aggregation result -> response rows).
+
+Compares the former row-wise implementation with the column-wise one for a
+growing number of accounts; time per account should stay flat.
+
+Run from backend/:  python -m benchmarks.bench_account_summary
+"""
+import asyncio
+import random
+import time
+
+import pandas as pd
+
+from app.services import valar_api
+from app.services.valar_service import ValarService
+from app.utils.json_response import frame_records
+
+SIZES = [100, 1_000, 5_000, 10_000]
+
+
+def make_docs(n: int):
+    rng = random.Random(0)
+    accounts = {f"ACC{i:05d}": rng.choice([0.0, 1e6, 5e6]) for i in range(n)}
+    docs = []
+    for accountid in accounts:
+        balance = rng.uniform(5e5, 6e6)
+        docs.append({
+            "accountid": accountid,
+            "balance": balance,
+            "margin": balance * rng.random(),
+            "available": balance * rng.random(),
+            "frozen": 0.0,
+            "updatetime": "2026-01-05 14:59:59",
+            "float_pnl": rng.uniform(-1e4, 1e4),
+        })
+    rng.shuffle(docs)
+    return docs, accounts
+
+
+def legacy_summary(docs, accounts):
+    """The former implementation: apply lambdas, list.index rank and iterrows."""
+    acc = pd.DataFrame(docs)
+    acc["float_pnl"] = acc["float_pnl"].astype(int)
+    acc["margin%"] = (acc["margin"]/acc["balance"]).apply(lambda x: format(x, ".2%"))
+    acc["init_cash"] = acc["accountid"].apply(lambda x: accounts[x])
+    acc["total_pnl"] = acc["balance"] - acc["init_cash"]
+    acc = acc.loc[:,["accountid","balance","float_pnl","total_pnl","margin","margin%","available","init_cash","frozen","updatetime"]]
+    acc["rank"] = acc["accountid"].apply(list(accounts.keys()).index)
+    df = acc.sort_values("rank")
+    rows = []
+    for _, row in df.iterrows():
+        rows.append({
+            "account_id": row["accountid"],
+            "balance": float(row["balance"]),
+            "float_pnl": float(row["float_pnl"]),
+            "total_pnl": float(row["total_pnl"]),
+            "margin": float(row["margin"]),
+            "margin_rate": row["margin%"],
+            "available": float(row["available"]),
+            "initial_capital": float(row["init_cash"]),
+            "frozen": float(row["frozen"]),
+            "update_time": row["updatetime"],
+            "profit_rate": ((row["balance"] - row["init_cash"]) / row["init_cash"] * 100) if row["init_cash"] > 0 else 0,
+        })
+    return rows
+
+
+SERVICE = ValarService()
+# No TTLs: every iteration builds the frame instead of hitting the response cache
+SERVICE.cache_ttls = {}
+
+
+def vectorized_summary(docs, accounts):
+    """The current implementation, with the Mongo aggregation replaced by ``docs``."""
+    async def fetch(name, initial_capitals):
+        return valar_api.build_accounts_frame(docs, initial_capitals)
+
+    SERVICE._fetch = fetch
+    loop = asyncio.new_event_loop()
+    try:
+        frame = loop.run_until_complete(SERVICE.get_account_summary_frame(list(accounts), accounts))
+    finally:
+        loop.close()
+    return frame_records(frame)
+
+
+def timed(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'accounts':>8} {'legacy ms':>10} {'us/acct':>8} {'vector ms':>10} {'us/acct':>8}")
+    for n in SIZES:
+        docs, accounts = make_docs(n)
+        old = legacy_summary(docs, accounts)
+        new = vectorized_summary(docs, accounts)
+        assert [r["account_id"] for r in old] == [r["account_id"] for r in new]
+        assert [r["margin_rate"] for r in old] == [r["margin_rate"] for r in new]
+        t_old = timed(legacy_summary, docs, accounts)
+        t_new = timed(vectorized_summary, docs, accounts)
+        print(f"{n:>8} {t_old * 1e3:>10.1f} {t_old / n * 1e6:>8.1f} {t_new * 1e3:>10.1f} {t_new / n * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,14 @@ import {
 import ReactECharts from 'echarts-for-react';
 import { dashboardService, DashboardSummary, AccountSummary, AccountHistoryData } from '../../services/dashboard';
 import { useRefreshStore } from '../../stores/refreshStore';
+import { liveStream } from '../../services/stream';
 import { useStatCardClasses, useRowChangeClasses } from '../../hooks/useValueChange';
 import dayjs from 'dayjs';
 import './index.css';
 
+// Upper bound on points per history series; the chart cannot show more anyway
+const HISTORY_MAX_POINTS = 2000;
+
 const Dashboard: React.FC = () => {
   const { setDashboardRefresh } = useRefreshStore();
   const [summary, setSummary] = useState<DashboardSummary | null>(null);
@@ -24,6 +28,11 @@ const Dashboard: React.FC = () => {
   const [selectedAccountForHistory, setSelectedAccountForHistory] = useState<string | undefined>(undefined);
 
   const fetchData = async () => {
+    // Pushed over the stream while it is connected
+    if (liveStream.isLive('accounts')) {
+      return;
+    }
+
     setLoading(true);
     try {
       const [summaryData, accountsData] = await Promise.all([
@@ -47,7 +56,7 @@ const Dashboard: React.FC = () => {
 
     setHistoryLoading(true);
     try {
-      const historyResult = await dashboardService.getAccountsHistory([selectedAccountForHistory], historyDays);
+      const historyResult = await dashboardService.getAccountsHistory([selectedAccountForHistory], historyDays, HISTORY_MAX_POINTS);
       setHistoryData(historyResult);
     } catch (error) {
       console.error('Failed to fetch history data:', error);
@@ -74,6 +83,14 @@ const Dashboard: React.FC = () => {
     fetchHistoryData();
   }, [historyDays, selectedAccountForHistory]);
 
+  // Receive summary and account changes instead of polling
+  useEffect(() => {
+    return liveStream.subscribe('accounts', {}, (data) => {
+      setSummary(data.summary);
+      setAccounts(data.accounts);
+    });
+  }, []);
+
   // 货币格式化工具
   const currencyFormatter = useMemo(
     () =>
@@ -616,7 +633,10 @@ const Dashboard: React.FC = () => {
                   { value: 5, label: '5天' },
                   { value: 7, label: '7天' },
                   { value: 15, label: '15天' },
-                  { value: 30, label: '30天' }
+                  { value: 30, label: '30天' },
+                  { value: 90, label: '90天' },
+                  { value: 180, label: '180天' },
+                  { value: 365, label: '365天' }
                 ]}
               />
             </Space>
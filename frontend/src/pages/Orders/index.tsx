@@ -3,6 +3,7 @@ import { Card, Table, Tabs, DatePicker, Button, Space, Tag, Row, Col, Progress,
 import { CalendarOutlined, PlusOutlined, MinusOutlined, UnorderedListOutlined, WarningOutlined } from '@ant-design/icons';
 import { ordersService, Order, Trade } from '../../services/orders';
 import { accountConfigApi } from '../../services/accountConfig';
+import { liveStream } from '../../services/stream';
 import { useRefreshStore } from '../../stores/refreshStore';
 import { useAuthStore } from '../../stores/authStore';
 import AccountSelector from '../../components/AccountSelector';
@@ -17,6 +18,7 @@ const Orders: React.FC = () => {
   const lastFetchedUserRef = useRef<number | null>(null);
   const [loading, setLoading] = useState(false);
   const [selectedDate, setSelectedDate] = useState<Dayjs>(dayjs());
+  const [currentTradeDate, setCurrentTradeDate] = useState<string | null>(null);
   const [orders, setOrders] = useState<Order[]>([]);
   const [trades, setTrades] = useState<Trade[]>([]);
   const [activeTab, setActiveTab] = useState('orders');
@@ -30,6 +32,7 @@ const Orders: React.FC = () => {
     const getCurrentDate = async () => {
       try {
         const currentDate = await ordersService.getCurrentTradeDate();
+        setCurrentTradeDate(currentDate);
         setSelectedDate(dayjs(currentDate));
       } catch (error) {
         console.error('Failed to fetch current trade date:', error);
@@ -98,6 +101,11 @@ const Orders: React.FC = () => {
       return;
     }
 
+    // Today's orders are pushed over the stream while it is connected
+    if (liveStream.isLive('orders') && selectedDate.format('YYYY-MM-DD') === currentTradeDate) {
+      return;
+    }
+
     setLoading(true);
     try {
       const dateStr = selectedDate.format('YYYY-MM-DD');
@@ -117,7 +125,7 @@ const Orders: React.FC = () => {
     } finally {
       setLoading(false);
     }
-  }, [selectedAccounts, selectedDate, isSpecialFilter]);
+  }, [selectedAccounts, selectedDate, isSpecialFilter, currentTradeDate]);
 
   useEffect(() => {
     setOrdersRefresh(fetchData);
@@ -127,6 +135,16 @@ const Orders: React.FC = () => {
     fetchData();
   }, [fetchData]);
 
+  // Receive today's order and trade changes instead of polling
+  useEffect(() => {
+    if (selectedAccounts.length === 0 || selectedDate.format('YYYY-MM-DD') !== currentTradeDate) return;
+    const params = { accounts: selectedAccounts, isSpecial: isSpecialFilter ? true : undefined };
+    return liveStream.subscribe('orders', params, (data) => {
+      setOrders(data.orders || []);
+      setTrades(data.trades || []);
+    });
+  }, [selectedAccounts, selectedDate, isSpecialFilter, currentTradeDate]);
+
   const getStatusColor = (status: string) => {
     switch (status) {
       case '全部成交':
@@ -3,6 +3,7 @@ import { Card, Table, Radio, Tag, Spin, Row, Col, Tooltip } from 'antd';
 import ReactECharts from 'echarts-for-react';
 import { positionsService, Position } from '../../services/positions';
 import { accountConfigApi } from '../../services/accountConfig';
+import { liveStream } from '../../services/stream';
 import { useAuthStore } from '../../stores/authStore';
 import { useRefreshStore } from '../../stores/refreshStore';
 import AccountSelector from '../../components/AccountSelector';
@@ -55,6 +56,11 @@ const Positions: React.FC = () => {
       return;
     }
 
+    // Pushed over the stream while it is connected
+    if (liveStream.isLive('positions')) {
+      return;
+    }
+
     setLoading(true);
     try {
       // Always use accounts array for consistent API calls
@@ -104,6 +110,14 @@ const Positions: React.FC = () => {
     setPositionsRefresh(fetchPositions);
   }, [selectedAccounts]);
 
+  // Receive position changes instead of polling
+  useEffect(() => {
+    if (selectedAccounts.length === 0) return;
+    return liveStream.subscribe('positions', { accounts: selectedAccounts }, (data) => {
+      setPositions(data.positions || []);
+    });
+  }, [selectedAccounts]);
+
   const formatCurrency = (value: number) => {
     return new Intl.NumberFormat('zh-CN', {
       style: 'currency',
@@ -56,9 +56,13 @@ export const dashboardService = {
     return await api.get('/dashboard/accounts');
   },
 
-  getAccountsHistory: async (accounts?: string[], days: number = 5): Promise<AccountHistoryData[]> => {
+  getAccountsHistory: async (accounts?: string[], days: number = 5, maxPoints?: number): Promise<AccountHistoryData[]> => {
     const searchParams = new URLSearchParams();
     searchParams.set('days', days.toString());
+    if (maxPoints) {
+      // Server-side LTTB downsampling keeps the chart shape with fewer points
+      searchParams.set('max_points', maxPoints.toString());
+    }
 
     if (accounts && accounts.length > 0) {
       accounts.forEach(acc => searchParams.append('accounts', acc));
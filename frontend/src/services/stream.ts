@@ -0,0 +1,115 @@
+// Live push channel: one WebSocket per tab, subscriptions per topic
+
+export type StreamTopic = 'accounts' | 'positions' | 'orders';
+
+interface StreamParams {
+  accounts?: string[];
+  isSpecial?: boolean;
+}
+
+interface Subscription {
+  params: StreamParams;
+  handler: (data: any) => void;
+}
+
+const API_BASE_URL = import.meta.env.VITE_API_URL || '/api/v1';
+const MAX_RETRY_DELAY = 30000;
+
+const streamUrl = (token: string) => {
+  const base = new URL(API_BASE_URL, window.location.href);
+  base.protocol = base.protocol === 'https:' ? 'wss:' : 'ws:';
+  return `${base.toString().replace(/\/$/, '')}/stream?token=${encodeURIComponent(token)}`;
+};
+
+class LiveStream {
+  private ws: WebSocket | null = null;
+  private subscriptions = new Map<StreamTopic, Subscription>();
+  private retryDelay = 1000;
+  private retryTimer: ReturnType<typeof setTimeout> | null = null;
+
+  // Whether pushed updates of the topic are flowing, so polling it can be skipped
+  isLive(topic: StreamTopic): boolean {
+    return this.ws?.readyState === WebSocket.OPEN && this.subscriptions.has(topic);
+  }
+
+  subscribe(topic: StreamTopic, params: StreamParams, handler: (data: any) => void): () => void {
+    const subscription = { params, handler };
+    this.subscriptions.set(topic, subscription);
+    if (this.ws?.readyState === WebSocket.OPEN) {
+      this.sendSubscribe(topic, subscription);
+    } else {
+      this.connect();
+    }
+
+    return () => {
+      // Only remove if it was not replaced by a newer subscription
+      if (this.subscriptions.get(topic) !== subscription) return;
+      this.subscriptions.delete(topic);
+      if (this.subscriptions.size === 0) {
+        this.disconnect();
+      } else if (this.ws?.readyState === WebSocket.OPEN) {
+        this.ws.send(JSON.stringify({ action: 'unsubscribe', topic }));
+      }
+    };
+  }
+
+  private sendSubscribe(topic: StreamTopic, { params }: Subscription) {
+    this.ws?.send(JSON.stringify({
+      action: 'subscribe',
+      topic,
+      accounts: params.accounts,
+      is_special: params.isSpecial ?? null,
+    }));
+  }
+
+  private connect() {
+    const token = localStorage.getItem('access_token');
+    if (!token || this.ws || this.retryTimer) return;
+
+    const ws = new WebSocket(streamUrl(token));
+    this.ws = ws;
+
+    ws.onopen = () => {
+      this.retryDelay = 1000;
+      this.subscriptions.forEach((subscription, topic) => this.sendSubscribe(topic, subscription));
+    };
+
+    ws.onmessage = (event) => {
+      try {
+        const message = JSON.parse(event.data);
+        if (message.type === 'update') {
+          this.subscriptions.get(message.topic)?.handler(message.data);
+        } else if (message.type === 'error') {
+          console.warn('Stream error:', message.detail);
+        }
+      } catch (error) {
+        console.warn('Invalid stream message:', error);
+      }
+    };
+
+    ws.onclose = () => {
+      if (this.ws !== ws) return;
+      this.ws = null;
+      // Reconnect with backoff while pages are still subscribed; polling covers the gap
+      if (this.subscriptions.size > 0) {
+        this.retryTimer = setTimeout(() => {
+          this.retryTimer = null;
+          this.connect();
+        }, this.retryDelay);
+        this.retryDelay = Math.min(this.retryDelay * 2, MAX_RETRY_DELAY);
+      }
+    };
+  }
+
+  private disconnect() {
+    if (this.retryTimer) {
+      clearTimeout(this.retryTimer);
+      this.retryTimer = null;
+    }
+    const ws = this.ws;
+    this.ws = null;
+    ws?.close();
+  }
+}
+
+export const liveStream = new LiveStream();
@@ -73,6 +73,8 @@ export default defineConfig(({ mode }) => {
           target: apiTarget,
           changeOrigin: true,
           secure: false,
+          // Proxy the /api/v1/stream WebSocket as well
+          ws: true,
           rewrite: (path) => path,
           configure: (proxy) => {
             proxy.on('proxyReq', (proxyReq, req) => {